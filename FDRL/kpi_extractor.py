@@ -0,0 +1,124 @@
+"""
+Streaming KPI extraction from SUMO output files
+Reads tripinfos.xml / stopinfos.xml / stats.xml with iterparse (constant memory)
+and produces the same JSON schema as inference_results/*.json
+"""
+
+import os
+import xml.etree.ElementTree as ET
+from collections import Counter, defaultdict
+
+PERCENTILES = (50, 90, 95)
+
+
+def iter_elements(path, tag):
+    """Yield attribute dicts of every <tag> element, clearing parsed nodes."""
+    context = ET.iterparse(path, events=("start", "end"))
+    _, root = next(context)
+    for event, elem in context:
+        if event == "end" and elem.tag == tag:
+            yield elem.attrib
+            root.clear()
+
+
+class CategoryAccumulator:
+    """Running sums + 1-second waiting time histogram for one vehicle category."""
+
+    def __init__(self):
+        self.count = 0
+        self.wait_sum = 0.0
+        self.time_loss_sum = 0.0
+        self.travel_time_sum = 0.0
+        self.wait_histogram = Counter()
+
+    def add(self, wait, time_loss, travel_time):
+        self.count += 1
+        self.wait_sum += wait
+        self.time_loss_sum += time_loss
+        self.travel_time_sum += travel_time
+        self.wait_histogram[int(round(wait))] += 1
+
+    def merge(self, other):
+        self.count += other.count
+        self.wait_sum += other.wait_sum
+        self.time_loss_sum += other.time_loss_sum
+        self.travel_time_sum += other.travel_time_sum
+        self.wait_histogram.update(other.wait_histogram)
+
+    def percentile(self, q):
+        if self.count == 0:
+            return 0.0
+        target = q / 100.0 * self.count
+        seen = 0
+        for value in sorted(self.wait_histogram):
+            seen += self.wait_histogram[value]
+            if seen >= target:
+                return float(value)
+        return float(max(self.wait_histogram))
+
+    def to_entry(self, vehicle_type):
+        n = self.count or 1
+        entry = {
+            "vehicle_type": vehicle_type,
+            "no_of_vehicles": self.count,
+            "avg_waiting_time": round(self.wait_sum / n, 2),
+            "avg_time_loss": round(self.time_loss_sum / n, 2),
+            "avg_travel_time": round(self.travel_time_sum / n, 2),
+        }
+        for q in PERCENTILES:
+            entry[f"p{q}_waiting_time"] = self.percentile(q)
+        return entry
+
+
+def parse_tripinfos(path, categorize):
+    """Per-category accumulators from a tripinfo file."""
+    stats = defaultdict(CategoryAccumulator)
+    for trip in iter_elements(path, "tripinfo"):
+        category = categorize(trip.get("vType", ""))
+        stats[category].add(
+            float(trip.get("waitingTime", 0.0)),
+            float(trip.get("timeLoss", 0.0)),
+            float(trip.get("duration", 0.0)),
+        )
+    return stats
+
+
+def parse_stopinfos(path):
+    """Number of public transport / parking stops and their mean delay."""
+    count, delay_sum = 0, 0.0
+    for stop in iter_elements(path, "stopinfo"):
+        count += 1
+        delay_sum += float(stop.get("delay", 0.0))
+    return {
+        "no_of_stops": count,
+        "avg_stop_delay": round(delay_sum / count, 2) if count else 0.0,
+    }
+
+
+def parse_statistics(path):
+    """Teleport counters from a statistic-output file."""
+    for teleports in iter_elements(path, "teleports"):
+        return {k: int(v) for k, v in teleports.items()}
+    return {"total": 0}
+
+
+def extract_kpis(tripinfo_file, categorize, stats_file=None, stopinfo_file=None):
+    """
+    Build the inference_results 'traffic_data' list (one entry per category,
+    'any' last) plus teleport / stop summaries from SUMO output files.
+    """
+    stats = parse_tripinfos(tripinfo_file, categorize)
+
+    traffic_data = []
+    overall = CategoryAccumulator()
+    for category, acc in stats.items():
+        traffic_data.append(acc.to_entry(category))
+        overall.merge(acc)
+    traffic_data.append(overall.to_entry("any"))
+
+    kpis = {"traffic_data": traffic_data}
+    if stats_file and os.path.exists(stats_file):
+        kpis["teleports"] = parse_statistics(stats_file)
+    if stopinfo_file and os.path.exists(stopinfo_file):
+        kpis["stops"] = parse_stopinfos(stopinfo_file)
+    return kpis
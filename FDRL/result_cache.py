@@ -0,0 +1,107 @@
+"""
+Content-addressed cache for baseline (default/fixed) inference results.
+A baseline result only depends on the network, routes, additional files
+(incl. the TLS programs), the SUMO command line, run duration, seed, SUMO
+version and the KPI code (CACHE_VERSION).
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import xml.etree.ElementTree as ET
+
+CACHE_DIR = "inference_results/cache"
+DEFAULT_SEED = "23"  # SUMO's built-in seed when none is configured
+# Bump whenever KPI extraction or the result format changes
+CACHE_VERSION = 1
+
+
+def sumo_inputs(sumocfg):
+    """Input files and seed referenced by a .sumocfg (paths resolved)."""
+    base_dir = os.path.dirname(os.path.abspath(sumocfg))
+    root = ET.parse(sumocfg).getroot()
+
+    files = [os.path.abspath(sumocfg)]
+    for tag in ("net-file", "route-files", "additional-files"):
+        for elem in root.iter(tag):
+            for name in elem.get("value", "").split(","):
+                if name.strip():
+                    files.append(os.path.join(base_dir, name.strip()))
+
+    seed = DEFAULT_SEED
+    for elem in root.iter("seed"):
+        seed = elem.get("value", DEFAULT_SEED)
+    return files, seed
+
+
+def sumo_version(binary="sumo"):
+    try:
+        out = subprocess.run(
+            [binary, "--version"], capture_output=True, text=True, check=False
+        ).stdout
+        return out.splitlines()[0].strip() if out else "unknown"
+    except OSError:
+        return "unknown"
+
+
+def _hash_file(digest, path):
+    digest.update(os.path.basename(path).encode())
+    if not os.path.exists(path):
+        digest.update(b"<missing>")
+        return
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+
+
+def _command_options(sumo_cmd):
+    """SUMO options without the binary and config path; output file paths
+    are per run, so only the option name counts."""
+    options = list(sumo_cmd[1:])
+    for i, arg in enumerate(options[:-1]):
+        if arg in ("-c", "--configuration-file"):
+            options[i + 1] = "<config>"  # hashed by content
+        elif arg.endswith("-output"):
+            options[i + 1] = "<output>"
+    return options
+
+
+def baseline_cache_key(config, mode, duration, kpi_source, sumo_cmd):
+    files, seed = sumo_inputs(config["sumo"]["config_file"])
+    digest = hashlib.sha256()
+    for path in files:
+        _hash_file(digest, path)
+    meta = {
+        "cache_version": CACHE_VERSION,
+        "mode": mode,
+        "duration": duration,
+        "seed": seed,
+        "kpi_source": kpi_source,
+        "sumo_options": _command_options(sumo_cmd),
+        "sumo_version": sumo_version(),
+    }
+    digest.update(json.dumps(meta, sort_keys=True).encode())
+    return digest.hexdigest()[:16]
+
+
+def cache_path(mode, key, cache_dir=CACHE_DIR):
+    return os.path.join(cache_dir, f"{mode}-{key}.json")
+
+
+def restore(mode, key, output_file, cache_dir=CACHE_DIR):
+    """Copy a cached result to output_file. Returns True on a cache hit."""
+    path = cache_path(mode, key, cache_dir)
+    if not os.path.exists(path):
+        return False
+    if os.path.abspath(path) != os.path.abspath(output_file):
+        shutil.copyfile(path, output_file)
+    return True
+
+
+def store(mode, key, output_file, cache_dir=CACHE_DIR):
+    if not os.path.exists(output_file):
+        return
+    os.makedirs(cache_dir, exist_ok=True)
+    shutil.copyfile(output_file, cache_path(mode, key, cache_dir))
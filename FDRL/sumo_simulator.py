@@ -13,9 +13,37 @@ import random
 random.seed(0)
 
 
+def sumo_command(config_file, step_length=1.0, gui=False, sumo_args=None):
+    """The SUMO command line a SumoSimulator starts (also hashed by result_cache)."""
+    return [
+        "sumo-gui" if gui else "sumo",
+        "-c",
+        config_file,
+        "--step-length",
+        str(step_length),
+        "--no-warnings",
+        "true",
+        "--time-to-teleport",
+        "300",
+        "--no-step-log",
+        "true",
+        "--duration-log.disable",
+        "true",
+    ] + list(sumo_args or [])
+
+
 class SumoSimulator:
-    def __init__(self, config_file, config, step_length=1.0, gui=False, queue_dist=150):
+    def __init__(
+        self,
+        config_file,
+        config,
+        step_length=1.0,
+        gui=False,
+        queue_dist=150,
+        sumo_args=None,
+    ):
         self.config_file = config_file
+        self.sumo_args = list(sumo_args or [])
         self.step_length = step_length
         self.gui = gui
         self.queue_detection_distance = queue_dist
@@ -39,6 +67,9 @@ class SumoSimulator:
         self.phase_timers = {}
         self.current_actions = {}
 
+        # Called after every simulation step (e.g. statistics collectors)
+        self.step_listeners = []
+
     def _assign_vehicle_type(self):
         r = random.random()
         if r < 0.70:
@@ -76,24 +107,9 @@ class SumoSimulator:
         else:
             sys.exit("Please declare environment variable 'SUMO_HOME'")
 
-        sumo_binary = "sumo-gui" if self.gui else "sumo"
-        sumo_cmd = [
-            sumo_binary,
-            "-c",
-            self.config_file,
-            "--step-length",
-            str(self.step_length),
-            "--no-warnings",
-            "true",
-            "--time-to-teleport",
-            "300",
-            "--no-step-log",
-            "true",
-            "--duration-log.disable",
-            "true",
-        ]
-
-        traci.start(sumo_cmd)
+        traci.start(
+            sumo_command(self.config_file, self.step_length, self.gui, self.sumo_args)
+        )
 
     def _get_junctions_and_phase_maps(self):
         """
@@ -188,6 +204,28 @@ class SumoSimulator:
         for _ in range(green_time):
             self.simulation_step()
 
+    def set_phases(self, actions, yellow_time, green_time):
+        """
+        Apply one synchronous decision step for many junctions.
+        actions: {junction_id: UNPADDED action_index}
+        All phases are switched first, then the simulation advances once.
+        """
+        for junction_id, action_index in actions.items():
+            junction_info = self.junctions[junction_id]
+
+            # Padded or unmapped actions keep the current phase
+            if action_index >= junction_info["num_roads"]:
+                continue
+            if action_index not in junction_info["action_to_phase"]:
+                continue
+
+            traci.trafficlight.setPhase(
+                junction_id, junction_info["action_to_phase"][action_index]
+            )
+
+        for _ in range(green_time):
+            self.simulation_step()
+
     def get_state(self, junction_id):
         """
         Returns PADDED state vector for universal model with PRIORITY WEIGHTS.
@@ -291,6 +329,8 @@ class SumoSimulator:
 
     def simulation_step(self):
         traci.simulationStep()
+        for listener in self.step_listeners:
+            listener()
         # new_vehicles = traci.simulation.getDepartedIDList()
         # for v_id in new_vehicles:
         #     new_type = self._assign_vehicle_type()
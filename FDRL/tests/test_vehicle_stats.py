@@ -0,0 +1,66 @@
+import os
+import sys
+import types
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+pytest.importorskip("torch")
+pytest.importorskip("traci")
+
+import infer  # noqa: E402
+
+
+class FakeTraCI:
+    """
+    Just enough of traci for VehicleStatsCollector. Like the real client,
+    getAllSubscriptionResults() returns one dict that every step clears and
+    refills in place.
+    """
+
+    def __init__(self, tc):
+        self.tc = tc
+        self._results = {}
+        self._subscribed = set()
+        self._departed = []
+        self._arrived = []
+        self.simulation = types.SimpleNamespace(
+            getDepartedIDList=lambda: list(self._departed),
+            getArrivedIDList=lambda: list(self._arrived),
+        )
+        self.vehicle = types.SimpleNamespace(
+            subscribe=lambda vid, variables: self._subscribed.add(vid),
+            getAllSubscriptionResults=lambda: self._results,
+        )
+
+    def step(self, departed=(), arrived=(), running=None):
+        """running: {vid: (vtype, accumulated waiting)} still in the network"""
+        self._departed = list(departed)
+        self._arrived = list(arrived)
+        self._results.clear()
+        for vid, (vtype, wait) in (running or {}).items():
+            if vid in self._subscribed or vid in self._departed:
+                self._results[vid] = {
+                    self.tc.VAR_TYPE: vtype,
+                    self.tc.VAR_ACCUMULATED_WAITING_TIME: wait,
+                }
+
+
+def test_arrivals_are_recorded_with_their_last_waiting_time(monkeypatch):
+    fake = FakeTraCI(infer.tc)
+    monkeypatch.setattr(infer, "traci", fake)
+    collector = infer.VehicleStatsCollector()
+
+    fake.step(departed=["car1", "bus1"], running={"car1": ("passenger", 0.0), "bus1": ("bus", 0.0)})
+    collector.on_step()
+    fake.step(running={"car1": ("passenger", 4.0), "bus1": ("bus", 2.0)})
+    collector.on_step()
+    # car1 left the network during this step; results no longer contain it
+    fake.step(arrived=["car1"], running={"bus1": ("bus", 3.0)})
+    collector.on_step()
+
+    assert collector.finished == {"car1": {"category": "car", "wait_time": 4.0}}
+
+    collector.finalize()
+    assert collector.finished["bus1"] == {"category": "bus", "wait_time": 3.0}
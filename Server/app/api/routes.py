@@ -1,6 +1,24 @@
-from flask import jsonify, request, send_file
+import eventlet
+from flask import Response, abort, jsonify, request, send_file
 
-def register_routes(app, sumo_mgr, event_mgr, socketio):
+from core.event_manager import event_times
+from core.loop_metrics import METRICS, exposition, merge
+from core.session_pool import DEFAULT_SESSION, session_from_request
+from core.what_if import WhatIfRunner
+
+
+def register_routes(app, sumo_mgr, event_mgr, socketio, sessions=None, comparison=None, mode=None):
+
+    def current():
+        """(sumo_mgr, event_mgr, room) of the session named by ?session= / X-Session"""
+        if sessions is None:
+            return sumo_mgr, event_mgr, None
+        session = session_from_request(sessions, request)
+        if session is None:
+            abort(404, description="Unknown session")
+        return session.sumo, session.events, session.room()
+
+    what_if = WhatIfRunner(sumo_mgr.config)
     
     @app.route("/")
     def index():
@@ -12,6 +30,7 @@ def register_routes(app, sumo_mgr, event_mgr, socketio):
     
     @app.route("/api/streets")
     def get_streets():
+        sumo_mgr, _, _ = current()
         if sumo_mgr.simulation_running:
             sumo_mgr.load_available_streets()
         return jsonify({
@@ -20,12 +39,132 @@ def register_routes(app, sumo_mgr, event_mgr, socketio):
             'closed': list(sumo_mgr.closed_streets)
         })
     
+    @app.route("/api/streets/geometry")
+    def get_street_geometry():
+        """GeoJSON street geometry, pre-compressed and cacheable by version"""
+        geometry = sumo_mgr.street_geometry
+        if geometry is None:
+            return jsonify({"error": "Network not loaded"}), 503
+
+        if geometry.version in request.if_none_match:
+            response = Response(status=304)
+        else:
+            body, encoding = geometry.encoded(request.headers.get("Accept-Encoding", ""))
+            response = Response(body, mimetype="application/geo+json")
+            if encoding:
+                response.headers["Content-Encoding"] = encoding
+
+        response.set_etag(geometry.version)
+        response.headers["Vary"] = "Accept-Encoding"
+        response.cache_control.public = True
+        if request.args.get("v") == geometry.version:
+            # Versioned URL: content can never change
+            response.cache_control.max_age = 31536000
+            response.cache_control.immutable = True
+        else:
+            response.cache_control.no_cache = True
+        return response
+
+    @app.route("/api/sessions")
+    def get_sessions():
+        if sessions is None:
+            return jsonify({"sessions": [], "enabled": False})
+        return jsonify({
+            "sessions": sessions.list(),
+            "enabled": True,
+            "max_sessions": sessions.max_sessions,
+        })
+
+    @app.route("/api/metrics/history")
+    def get_metrics_history():
+        """KPI history: ?from=&to= (simulation s), ?resolution= (s per bucket), ?junctions=a,b"""
+        sumo_mgr, _, _ = current()
+        try:
+            t_from = request.args.get("from", type=int)
+            t_to = request.args.get("to", type=int)
+            resolution = request.args.get("resolution", default=1, type=int)
+            if resolution is None or resolution < 1:
+                raise ValueError("resolution must be a positive integer")
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        junctions = request.args.get("junctions")
+        junctions = set(junctions.split(",")) if junctions else None
+        history = sumo_mgr.metrics_history(t_from, t_to, resolution, junctions)
+        if history is None:
+            return jsonify({"error": "Simulation unavailable"}), 503
+        return jsonify(history)
+
+    @app.route("/api/heatmap")
+    def get_heatmap():
+        """Decayed vehicle density grid: non-empty cells as [row, col, intensity]"""
+        sumo_mgr, _, _ = current()
+        grid = sumo_mgr.heatmap_grid()
+        if grid is None:
+            return jsonify({"error": "Simulation unavailable"}), 503
+        return jsonify(grid)
+
+    @app.route("/metrics")
+    def get_metrics():
+        """Prometheus scrape; loop instrumentation records only while this is polled"""
+        families = METRICS.collect()
+        if sessions is None:
+            simulations = [(DEFAULT_SESSION, sumo_mgr, event_mgr, mode)]
+        else:
+            simulations = [
+                (s.id, s.sumo, s.events, s.mode) for s in list(sessions.sessions.values())
+            ]
+
+        # Worker processes: their own loop and TraCI metrics, fetched concurrently
+        # with a short timeout; a session that does not answer is left out
+        workers = [
+            (session_id, session_sumo.client) for session_id, session_sumo, _, _ in simulations
+            if getattr(session_sumo, "client", None) is not None and session_sumo.client.alive()
+        ]
+        pool = eventlet.GreenPool(max(1, len(workers)))
+        fetched = pool.imap(
+            lambda client: client.call("metrics", timeout=client.metrics_timeout),
+            [client for _, client in workers],
+        )
+        for (session_id, _), worker_families in zip(workers, fetched):
+            merge(families, worker_families or {}, {"session": session_id})
+
+        clients, events = [], []
+        for session_id, session_sumo, session_events, session_mode in simulations:
+            labels = {"session": session_id}
+            if session_mode is not None:
+                clients.append(("", labels, len(session_mode.frames.formats)))
+            events.append(("", labels, len(session_events.events)))
+
+        merge(families, {
+            "vegha_connected_clients": ("gauge", "Connected Socket.IO clients", clients),
+            "vegha_events": ("gauge", "Scheduled, active and finished events", events),
+        })
+        return Response(exposition(families), mimetype="text/plain; version=0.0.4")
+
+    @app.route("/api/replay")
+    def get_replay():
+        """Recording being replayed: time range, position, speed"""
+        sumo_mgr, _, _ = current()
+        if not hasattr(sumo_mgr, "replay_info"):
+            return jsonify({"replay": False})
+        return jsonify({"replay": True, **sumo_mgr.replay_info()})
+
+    @app.route("/api/compare")
+    def get_comparison():
+        """Latest vegha-vs-fixed KPI delta of the side-by-side run"""
+        if comparison is None:
+            return jsonify({"running": False, "delta": None})
+        return jsonify(comparison.status())
+
     @app.route("/api/events", methods=["GET"])
     def get_events():
+        _, event_mgr, _ = current()
         return jsonify({"events": event_mgr.events})
     
     @app.route("/api/events/create", methods=["POST"])
     def create_event():
+        sumo_mgr, event_mgr, room = current()
         data = request.get_json()
         event_id = data.get("id")
         title = data.get("title")
@@ -39,6 +178,15 @@ def register_routes(app, sumo_mgr, event_mgr, socketio):
 
         if not sumo_mgr.simulation_running:
             return jsonify({"error": "Sim not running"}), 400
+
+        # Schedule in simulation seconds; missing times (now / no end) are
+        # filled in, and the end checked against the current time, by the manager
+        start_time = data.get("start_time")
+        end_time = data.get("end_time")
+        try:
+            event_times(start_time, end_time, 0)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
         
         # Auto-generate ID if missing
         if not event_id:
@@ -49,18 +197,17 @@ def register_routes(app, sumo_mgr, event_mgr, socketio):
         if event_mgr.id_exists(event_id):
              return jsonify({"error": "Event ID already exists"}), 400
 
-        # Create Event
-        event = event_mgr.create_event(event_id, title, streets)
+        # Create Event; it closes its streets itself once it starts
+        # (immediately unless a future start_time is given)
+        try:
+            event = event_mgr.create_event(event_id, title, streets, start_time, end_time)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400  # e.g. end_time <= simulation time
+        if event is None:
+            return jsonify({"error": "Event could not be created"}), 400  # Worker refused it
         
-        # Functionally close the streets
-        # Functionally close the streets
-        for street_id in streets:
-            # Use force_close_street to avoid removing it from the event!
-            print(f"DEBUG: Closing street: {street_id}")
-            event_mgr.force_close_street(street_id)
-            
         # Emit update
-        socketio.emit("event_created", event)
+        socketio.emit("event_created", event, to=room)
         
         # Also emit standard street status update
         socketio.emit("street_status", {
@@ -68,12 +215,57 @@ def register_routes(app, sumo_mgr, event_mgr, socketio):
             "action": "closed_bulk",
             "streets": streets,
             "closed_streets": list(sumo_mgr.closed_streets)
-        })
+        }, to=room)
         
         return jsonify({"message": "Event created", "event": event}), 201
     
+    @app.route("/api/events/what-if", methods=["POST"])
+    def what_if_event():
+        """
+        Predict an event's impact: {streets, minutes} or {alternatives: [{name, streets}],
+        minutes}. Runs each alternative and a no-change baseline from the current
+        state, headless and in parallel; returns their KPIs and the delta.
+        """
+        sumo_mgr, _, _ = current()
+        data = request.get_json() or {}
+
+        alternatives = data.get("alternatives")
+        if alternatives is None and data.get("streets"):
+            alternatives = [{"name": data.get("title") or "proposal", "streets": data["streets"]}]
+        if not alternatives or not isinstance(alternatives, list):
+            return jsonify({"error": "Missing streets or alternatives"}), 400
+        if len(alternatives) > what_if.max_alternatives:
+            return jsonify({"error": f"At most {what_if.max_alternatives} alternatives"}), 400
+
+        proposals = []
+        for n, alternative in enumerate(alternatives, 1):
+            streets = alternative.get("streets") if isinstance(alternative, dict) else None
+            if not streets or not isinstance(streets, list):
+                return jsonify({"error": f"Alternative {n} has no streets"}), 400
+            proposals.append({"name": str(alternative.get("name") or f"alternative {n}"), "streets": list(streets)})
+
+        try:
+            minutes = float(data.get("minutes", 10))
+        except (TypeError, ValueError):
+            return jsonify({"error": "minutes must be a number"}), 400
+        if not 0 < minutes <= what_if.max_minutes:
+            return jsonify({"error": f"minutes must be in (0, {what_if.max_minutes}]"}), 400
+
+        if not sumo_mgr.simulation_running or not hasattr(sumo_mgr, "fork_state"):
+            return jsonify({"error": "Sim not running"}), 400
+        try:
+            fork = sumo_mgr.fork_state()
+        except Exception as e:
+            print(f"❌ What-if state save failed: {e}")
+            fork = None
+        if fork is None:
+            return jsonify({"error": "Could not save the simulation state"}), 503
+
+        return jsonify(what_if.run(fork, proposals, minutes))
+
     @app.route("/api/streets/close", methods=["POST"])
     def close_street():
+        sumo_mgr, event_mgr, room = current()
         street = request.json.get("street")
         print(f"DEBUG: Closing street: {street}")
         event_mgr.handle_manual_close(street)
@@ -81,22 +273,24 @@ def register_routes(app, sumo_mgr, event_mgr, socketio):
             "action": "closed",
             "street": street,
             "closed_streets": list(sumo_mgr.closed_streets)
-        })
+        }, to=room)
         return jsonify({"success": True})
     
     @app.route("/api/streets/open", methods=["POST"])
     def open_street():
+        sumo_mgr, event_mgr, room = current()
         street = request.json.get("street")
         event_mgr.handle_manual_open(street)
         socketio.emit("street_status", {
             "action": "opened",
             "street": street,
             "closed_streets": list(sumo_mgr.closed_streets)
-        })
+        }, to=room)
         return jsonify({"success": True})
 
     @app.route("/api/events/remove", methods=["POST"])
     def remove_event():
+        sumo_mgr, event_mgr, room = current()
         event_id = request.json.get("id")
         if not event_id:
              return jsonify({"error": "Missing event id"}), 400
@@ -106,14 +300,14 @@ def register_routes(app, sumo_mgr, event_mgr, socketio):
             return jsonify({"error": "Event not found"}), 404
             
         # Emit update so all clients refresh
-        socketio.emit("event_removed", {"id": event_id})
+        socketio.emit("event_removed", {"id": event_id}, to=room)
         
         # Also emit street status to force map refresh if needed
         socketio.emit("street_status", {
             "success": True,
             "action": "opened_bulk", 
             "closed_streets": list(sumo_mgr.closed_streets)
-        })
+        }, to=room)
         
         return jsonify({"success": True})
 
@@ -1,61 +1,45 @@
-import traci
+from flask import request
 
+from core.comparison import COMPARE_ROOM
+from core.session_pool import DEFAULT_SESSION
 
-def register_socketio_handlers(socketio, sumo_mgr, event_mgr, mode):
-    """Register all SocketIO event handlers"""
 
-    @socketio.on("connect")
-    def handle_connect():
-        """Send streets with coordinates on connect"""
-        import traci
+def register_socketio_handlers(socketio, sumo_mgr, event_mgr, mode, sessions=None, comparison=None):
+    """Register all SocketIO event handlers"""
 
-        streets_data = []
+    def current():
+        """(sumo_mgr, event_mgr, mode, room) of the requesting client's session"""
+        if sessions is None:
+            return sumo_mgr, event_mgr, mode, None
+        session = sessions.session_of(request.sid)
+        return session.sumo, session.events, session.mode, session.room()
 
-        try:
-            # Get all edges from SUMO
-            all_edges = traci.edge.getIDList()
-            print(f"📍 Loading {len(all_edges)} streets...")
-
-            for edge_id in all_edges:
-                # Skip internal junctions
-                if edge_id.startswith(":"):
-                    continue
-
-                try:
-                    # Get first lane of edge for shape
-                    lane_id = edge_id + "_0"
-                    shape = traci.lane.getShape(lane_id)
-
-                    # Convert to lat/lon coordinates
-                    coords = []
-                    for x, y in shape:
-                        lon, lat = traci.simulation.convertGeo(x, y, fromGeo=False)
-                        coords.append([lat, lon])  # Leaflet uses [lat, lon]
-
-                    if coords and len(coords) >= 2:  # Only streets with valid paths
-                        streets_data.append({"name": edge_id, "coordinates": coords})
-                except:
-                    pass
-
-            print(f"✅ Loaded {len(streets_data)} streets with coordinates")
-
-            # Emit with coordinates for map drawing
+    def announce_streets(sumo_mgr):
+        geometry = sumo_mgr.street_geometry
+        if geometry is None:
             socketio.emit(
                 "streets_loaded",
-                {
-                    "streets": [s["name"] for s in streets_data],
-                    "streets_with_coords": streets_data,  # ← KEY: HTML uses this to draw on map
-                    "total": len(streets_data),
-                },
-            )
-        except Exception as e:
-            print(f"❌ Error loading streets: {e}")
-            socketio.emit(
-                "streets_loaded", {"streets": [], "streets_with_coords": [], "total": 0}
+                {"streets": [], "streets_with_coords": [], "total": 0},
+                to=request.sid,
             )
+            return
+
+        # Only this client: reconnects never touch TraCI or other clients
+        socketio.emit("streets_loaded", geometry.announcement(), to=request.sid)
+
+    @socketio.on("connect")
+    def handle_connect():
+        """Announce the street geometry version; clients fetch it over HTTP"""
+        # New clients get legacy full JSON frames until they negotiate
+        if sessions is None:
+            mode.frames.add_client(request.sid)
+        else:
+            sessions.join(request.sid, DEFAULT_SESSION)
+        announce_streets(sumo_mgr)
 
     @socketio.on("start")
     def handle_start():
+        sumo_mgr, _, mode, _ = current()
         # Start background loop ONCE
         if not getattr(sumo_mgr, "loop_started", False):
             sumo_mgr.loop_started = True
@@ -71,31 +55,34 @@ def register_socketio_handlers(socketio, sumo_mgr, event_mgr, mode):
 
     @socketio.on("pause")
     def handle_pause():
+        sumo_mgr, _, _, _ = current()
         sumo_mgr.simulation_paused = not sumo_mgr.simulation_paused
         print(f"⏸️  Simulation {'paused' if sumo_mgr.simulation_paused else 'resumed'}")
 
     @socketio.on("reset")
     def handle_reset():
-        sumo_mgr.simulation_running = False
-        sumo_mgr.simulation_paused = False  # ✅ ADD
-        sumo_mgr.closed_streets.clear()
-        event_mgr.events.clear()
-
-        try:
-            traci.close()  # ✅ ADD (important)
-        except:
-            pass
+        sumo_mgr, event_mgr, _, room = current()
+        # Stops the loop and closes TraCI (important)
+        sumo_mgr.shutdown_simulation()
+        event_mgr.clear_events()
 
-        socketio.emit("event_update", [])
+        socketio.emit("event_update", [], to=room)
         print("🔄 Simulation reset")
 
     @socketio.on("speed")
     def handle_speed(data):
-        sumo_mgr.config["simulation_speed"] = 0.1 / data.get("speed", 1)
+        sumo_mgr, _, _, _ = current()
+        speed = data.get("speed", 1)
+        if speed == "turbo":
+            # No pacing: step as fast as SUMO allows, clients still get broadcast_fps
+            sumo_mgr.set_speed(0)
+        else:
+            sumo_mgr.set_speed(0.1 / float(speed))
 
     @socketio.on("get_streets")
     def handle_get_streets():
         """Get list of all streets"""
+        sumo_mgr, _, _, room = current()
         socketio.emit(
             "streets_list",
             {
@@ -103,67 +90,34 @@ def register_socketio_handlers(socketio, sumo_mgr, event_mgr, mode):
                 "total": len(sumo_mgr.available_streets),
                 "closed": list(sumo_mgr.closed_streets),
             },
+            to=room,
         )
 
     @socketio.on("close_street")
     def handle_close_street(data):
         """Close a street immediately"""
+        sumo_mgr, event_mgr, _, room = current()
         street = data.get("street")
         print(f"DEBUG: handle_close_street received: {street}")
 
         if not street:
             socketio.emit(
-                "street_status", {"success": False, "error": "No street specified"}
+                "street_status", {"success": False, "error": "No street specified"}, to=room
             )
             return
 
         if not sumo_mgr.simulation_running:
             socketio.emit(
-                "street_status", {"success": False, "error": "Simulation not running"}
+                "street_status", {"success": False, "error": "Simulation not running"}, to=room
             )
             return
 
         try:
-            import traci
+            # Close the street (also removes and reroutes affected vehicles)
+            event_mgr.force_close_street(street)
 
             # Get edge coordinates for visualization
-            edge_coords = []
-            try:
-                lane_id = street + "_0"
-                shape = traci.lane.getShape(lane_id)
-                for x, y in shape:
-                    lon, lat = traci.simulation.convertGeo(x, y, fromGeo=False)
-                    edge_coords.append([lat, lon])
-            except:
-                pass
-
-            # Close the street
-            traci.edge.setDisallowed(
-                street,
-                [
-                    "passenger",
-                    "taxi",
-                    "bus",
-                    "truck",
-                    "trailer",
-                    "motorcycle",
-                    "moped",
-                    "bicycle",
-                    "pedestrian",
-                    "emergency",
-                    "delivery",
-                ],
-            )
-
-            # Remove vehicles on this street
-            vehicles_on_edge = traci.edge.getLastStepVehicleIDs(street)
-            for veh_id in vehicles_on_edge:
-                try:
-                    traci.vehicle.remove(veh_id)
-                except:
-                    pass
-
-            sumo_mgr.closed_streets.add(street)
+            edge_coords = sumo_mgr.street_coords(street)
 
             print(f"🚫 Street CLOSED: {street}")
 
@@ -177,50 +131,33 @@ def register_socketio_handlers(socketio, sumo_mgr, event_mgr, mode):
                     "closed_streets": list(sumo_mgr.closed_streets),
                     "edge_coords": edge_coords,
                 },
+                to=room,
             )
         except Exception as e:
             print(f"❌ Error closing street: {e}")
-            socketio.emit("street_status", {"success": False, "error": str(e)})
+            socketio.emit("street_status", {"success": False, "error": str(e)}, to=room)
 
     @socketio.on("open_street")
     def handle_open_street(data):
         """Reopen a closed street"""
+        sumo_mgr, event_mgr, _, room = current()
         street = data.get("street")
 
         if not street:
             socketio.emit(
-                "street_status", {"success": False, "error": "No street specified"}
+                "street_status", {"success": False, "error": "No street specified"}, to=room
             )
             return
 
         if not sumo_mgr.simulation_running:
             socketio.emit(
-                "street_status", {"success": False, "error": "Simulation not running"}
+                "street_status", {"success": False, "error": "Simulation not running"}, to=room
             )
             return
 
         try:
-            import traci
-
             # Open the street
-            traci.edge.setAllowed(
-                street,
-                [
-                    "passenger",
-                    "taxi",
-                    "bus",
-                    "truck",
-                    "trailer",
-                    "motorcycle",
-                    "moped",
-                    "bicycle",
-                    "pedestrian",
-                    "emergency",
-                    "delivery",
-                ],
-            )
-
-            sumo_mgr.closed_streets.discard(street)
+            event_mgr.force_open_street(street)
 
             print(f"✅ Street OPENED: {street}")
 
@@ -233,11 +170,148 @@ def register_socketio_handlers(socketio, sumo_mgr, event_mgr, mode):
                     "message": f"Street {street} opened",
                     "closed_streets": list(sumo_mgr.closed_streets),
                 },
+                to=room,
             )
         except Exception as e:
             print(f"❌ Error opening street: {e}")
-            socketio.emit("street_status", {"success": False, "error": str(e)})
+            socketio.emit("street_status", {"success": False, "error": str(e)}, to=room)
+
+    @socketio.on("frame_format")
+    def handle_frame_format(data):
+        """Switch this client's update frames: 'json' (full), 'delta' or 'binary'"""
+        _, _, mode, _ = current()
+        fmt = (data or {}).get("format", "json")
+        if not mode.frames.set_format(request.sid, fmt):
+            socketio.emit(
+                "frame_format",
+                {"success": False, "error": f"Unknown format: {fmt}"},
+                to=request.sid,
+            )
+            return
+        socketio.emit("frame_format", {"success": True, "format": fmt}, to=request.sid)
+
+    @socketio.on("resync")
+    def handle_resync():
+        """Delta client missed a frame: resend a keyframe to this client only"""
+        _, _, mode, _ = current()
+        mode.frames.resync(request.sid)
+
+    @socketio.on("viewport")
+    def handle_viewport(data):
+        """Client map view: {bounds: [south, west, north, east], zoom}; null clears it"""
+        _, _, mode, _ = current()
+        if not data:
+            mode.frames.clear_viewport(request.sid)
+            return
+        try:
+            south, west, north, east = (float(b) for b in data["bounds"])
+            zoom = float(data.get("zoom", 18))
+            if south > north or west > east:
+                raise ValueError("bounds must be [south, west, north, east]")
+        except (KeyError, TypeError, ValueError) as e:
+            socketio.emit("viewport", {"success": False, "error": str(e)}, to=request.sid)
+            return
+
+        if not mode.frames.set_viewport(request.sid, (south, west, north, east), zoom):
+            socketio.emit(
+                "viewport",
+                {"success": False, "error": "Viewport filtering needs the json or delta format"},
+                to=request.sid,
+            )
+
+    @socketio.on("heatmap")
+    def handle_heatmap(data):
+        """{enabled: true} streams `heatmap` grids to this client; false stops them"""
+        sumo_mgr, _, mode, _ = current()
+        enabled = bool((data or {}).get("enabled", True))
+        mode.frames.set_heatmap(request.sid, enabled)
+        if enabled:
+            socketio.emit("heatmap", sumo_mgr.heatmap_grid(), to=request.sid)
+
+    @socketio.on("seek")
+    def handle_seek(data):
+        """Replay only: jump to {time} (simulation seconds)"""
+        sumo_mgr, _, _, room = current()
+        if not hasattr(sumo_mgr, "seek"):
+            socketio.emit("replay", {"success": False, "error": "Not a replay"}, to=request.sid)
+            return
+        try:
+            sumo_mgr.seek(float((data or {}).get("time", 0)))
+        except (TypeError, ValueError) as e:
+            socketio.emit("replay", {"success": False, "error": str(e)}, to=request.sid)
+            return
+        socketio.emit("replay", {"success": True, **sumo_mgr.replay_info()}, to=room)
+
+    @socketio.on("join_session")
+    def handle_join_session(data):
+        """{session: id} joins an existing session, {session: "new"} starts one"""
+        if sessions is None:
+            socketio.emit(
+                "session", {"success": False, "error": "Sessions are disabled"}, to=request.sid
+            )
+            return
+
+        session_id = (data or {}).get("session") or DEFAULT_SESSION
+        if session_id == "new":
+            try:
+                session = sessions.create()
+            except RuntimeError as e:
+                socketio.emit("session", {"success": False, "error": str(e)}, to=request.sid)
+                return
+            if session is None:
+                socketio.emit(
+                    "session",
+                    {"success": False, "error": f"All {sessions.max_sessions} sessions are in use"},
+                    to=request.sid,
+                )
+                return
+        else:
+            session = sessions.get(session_id)
+            if session is None:
+                socketio.emit(
+                    "session", {"success": False, "error": f"Unknown session: {session_id}"}, to=request.sid
+                )
+                return
+
+        sessions.join(request.sid, session.id)
+        socketio.emit("session", {"success": True, **session.info()}, to=request.sid)
+        announce_streets(session.sumo)
+
+    @socketio.on("compare")
+    def handle_compare(data):
+        """Side-by-side vegha/fixed run: {action: start | pause | reset | stop | leave}"""
+        action = (data or {}).get("action", "start")
+        if comparison is None:
+            socketio.emit("compare_status", {"success": False, "error": "Comparison unavailable"}, to=request.sid)
+            return
+
+        if action == "leave":
+            socketio.server.leave_room(request.sid, COMPARE_ROOM, namespace="/")
+            return
+
+        try:
+            if action == "start":
+                socketio.server.enter_room(request.sid, COMPARE_ROOM, namespace="/")
+                comparison.start()
+            elif action == "pause":
+                comparison.pause()
+            elif action == "reset":
+                comparison.reset()
+            elif action == "stop":
+                comparison.stop()
+            else:
+                raise ValueError(f"Unknown action: {action}")
+        except Exception as e:
+            print(f"❌ Comparison error: {e}")
+            socketio.emit("compare_status", {"success": False, "error": str(e)}, to=request.sid)
+            return
+
+        socketio.emit("compare_status", {"success": True, **comparison.status()}, to=COMPARE_ROOM)
 
     @socketio.on("disconnect")
     def handle_disconnect():
+        if sessions is None:
+            mode.frames.remove_client(request.sid)
+        else:
+            sessions.leave(request.sid)
         print("❌ Client disconnected")
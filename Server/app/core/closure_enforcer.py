@@ -0,0 +1,70 @@
+import traci
+
+
+class ClosureEnforcer:
+    """
+    Keeps vehicles off closed streets without per-step route scans.
+    When a street closes, vehicles whose remaining route uses it are found
+    once and rerouted (or removed when no detour exists). After that only
+    newly departed vehicles are checked.
+    """
+
+    def __init__(self, sumo_manager):
+        self.sumo = sumo_manager
+
+    def street_closed(self, street):
+        """Enforce a new closure on vehicles already in the network."""
+        self.streets_closed((street,))
+
+    def streets_closed(self, streets):
+        """Enforce a batch of new closures with one pass over the vehicles."""
+        streets = set(streets)
+        if not streets:
+            return
+
+        # Vehicles on the streets themselves (closing code usually removed them already)
+        for street in streets:
+            for v_id in traci.edge.getLastStepVehicleIDs(street):
+                self._remove(v_id)
+
+        # Vehicles that will reach one of them later
+        for v_id in traci.vehicle.getIDList():
+            try:
+                if not streets.isdisjoint(self._remaining_route(v_id)):
+                    self._reroute_or_remove(v_id)
+            except traci.TraCIException:
+                continue
+
+    def update(self):
+        """Per step: check only vehicles that departed in this step."""
+        if not self.sumo.closed_streets:
+            return
+
+        for v_id in traci.simulation.getDepartedIDList():
+            try:
+                if self._crosses_closure(traci.vehicle.getRoute(v_id)):
+                    self._reroute_or_remove(v_id)
+            except traci.TraCIException:
+                continue
+
+    def _remaining_route(self, v_id):
+        return traci.vehicle.getRoute(v_id)[traci.vehicle.getRouteIndex(v_id):]
+
+    def _crosses_closure(self, edges):
+        return not self.sumo.closed_streets.isdisjoint(edges)
+
+    def _reroute_or_remove(self, v_id):
+        # Closed edges are disallowed, so the router avoids them when it can
+        try:
+            traci.vehicle.rerouteTraveltime(v_id)
+            if not self._crosses_closure(self._remaining_route(v_id)):
+                return
+        except traci.TraCIException:
+            pass
+        self._remove(v_id)
+
+    def _remove(self, v_id):
+        try:
+            traci.vehicle.remove(v_id)
+        except traci.TraCIException:
+            pass
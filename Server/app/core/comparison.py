@@ -0,0 +1,145 @@
+"""
+Side-by-side controller comparison: vegha vs fixed on identical demand.
+
+Each controller runs in its own worker process (sim_worker), so the two
+simulations use two cores, from the same sumocfg and `comparison.seed`. A
+single driver steps them in lockstep: both are told to advance, and only when
+both have finished is the next step issued. Clients in the `compare` room
+get one `compare_update` per frame tick carrying both states and the KPI
+delta (vegha minus fixed; negative waiting is better for vegha).
+"""
+
+import copy
+import time
+
+import eventlet
+
+from .sim_worker import SimulationClient
+
+CONTROLLERS = ("vegha", "fixed")
+COMPARE_ROOM = "compare"
+
+
+def kpi_delta(vegha, fixed):
+    """vegha - fixed for the headline KPIs, overall and per vehicle type"""
+    per_type = {}
+    for vtype in set(vegha["vehicle_stats"]) | set(fixed["vehicle_stats"]):
+        a = vegha["vehicle_stats"].get(vtype, {"count": 0, "avg_speed": 0, "waiting": 0})
+        b = fixed["vehicle_stats"].get(vtype, {"count": 0, "avg_speed": 0, "waiting": 0})
+        per_type[vtype] = {k: a[k] - b[k] for k in ("count", "avg_speed", "waiting")}
+
+    return {
+        "waiting": vegha["waiting"] - fixed["waiting"],
+        "avg_speed": vegha["avg_speed"] - fixed["avg_speed"],
+        "vehicle_stats": per_type,
+    }
+
+
+class ComparisonRun:
+    def __init__(self, socketio, config):
+        self.socketio = socketio
+        self.config = config
+
+        self.clients = {}
+        self.running = False
+        self.paused = False
+        self.step = 0
+        self.last_delta = None
+        self._driver = None
+
+    def start(self):
+        if not self.clients:
+            # Same seed for both: only the signal controller differs
+            config = copy.deepcopy(self.config)
+            config.setdefault("simulation", {})["seed"] = config.get("comparison", {}).get("seed", 42)
+            for controller in CONTROLLERS:
+                self.clients[controller] = SimulationClient(
+                    config, label=f"compare-{controller}", sumo_mode=controller
+                )
+            print("⚖️ Comparison workers ready")
+        elif not self.running and self.step >= self.config.get("max_steps", 7200):
+            # The last run went to max_steps: start over from time 0
+            self.reset()
+
+        self.paused = False
+        if not self.running:
+            self.running = True
+            self._driver = eventlet.spawn(self._drive)
+
+    def pause(self):
+        self.paused = not self.paused
+
+    def reset(self):
+        """Both back to time 0 (driver keeps running, paused)"""
+        self.paused = True
+        for client in self.clients.values():
+            client.call("reset")
+        self.step = 0
+        self.last_delta = None
+
+    def stop(self):
+        self.running = False
+        if self._driver is not None:
+            self._driver.wait()
+            self._driver = None
+        for client in self.clients.values():
+            client.stop()
+        self.clients = {}
+        print("⚖️ Comparison stopped")
+
+    def _advance_both(self):
+        """One lockstep step; the two workers compute in parallel"""
+        calls = {c: eventlet.spawn(client.call, "advance") for c, client in self.clients.items()}
+        return {c: call.wait() for c, call in calls.items()}
+
+    def _drive(self):
+        fps = self.config.get("streaming", {}).get("broadcast_fps", 10)
+        interval = 1.0 / fps
+        max_steps = self.config.get("max_steps", 7200)
+        next_frame = 0.0
+
+        while self.running and self.step < max_steps:
+            step_delay = self.config.get("simulation_speed", 0.1)
+            if self.paused:
+                eventlet.sleep(0.1)
+                continue
+
+            started = time.monotonic()
+            steps = self._advance_both()
+            if any(s is None for s in steps.values()):
+                print("⚠️ Comparison worker failed to step; pausing")
+                self.paused = True
+                continue
+            self.step = min(steps.values())
+
+            if started >= next_frame:
+                next_frame = started + interval
+                self._publish()
+
+            eventlet.sleep(max(0.0, step_delay - (time.monotonic() - started)))
+
+        self.running = False
+
+    def _publish(self):
+        frames = {}
+        for controller, client in self.clients.items():
+            _, snapshot = client.snapshots.latest()
+            if snapshot is None:
+                return
+            step, vehicles, tl_data, events = snapshot
+            frames[controller] = {"time": step, "vehicles": vehicles, **tl_data}
+
+        self.last_delta = kpi_delta(frames["vegha"], frames["fixed"])
+        self.socketio.emit(
+            "compare_update",
+            {"time": self.step, **frames, "delta": self.last_delta},
+            to=COMPARE_ROOM,
+        )
+
+    def status(self):
+        return {
+            "running": self.running,
+            "paused": self.paused,
+            "time": self.step,
+            "delta": self.last_delta,
+        }
@@ -0,0 +1,56 @@
+import traci
+import traci.constants as tc
+
+from .vehicle_table import VehicleTable
+
+
+def is_emergency_type(vtype):
+    """Vehicle types that get signal priority (trucks are treated as ambulances)"""
+    v = vtype.lower()
+    if "bus" in v or "motorcycle" in v or "bike" in v:
+        # Only explicit emergency/truck markers win over these categories
+        return "emergency" in v or "truck" in v
+    return any(k in v for k in ("ambulance", "emergency", "truck", "trailer"))
+
+
+class EmergencyVehicleRegistry:
+    """
+    Emergency vehicles currently in the network, maintained from the
+    departed/arrived lists. Each vType is classified once and every tracked
+    vehicle carries a VAR_NEXT_TLS subscription, so priority control costs
+    O(emergency vehicles) per step.
+    """
+
+    def __init__(self):
+        self.vehicles = set()
+        self._type_cache = {}
+
+    def reset(self):
+        """After traci.load: all vehicles and subscriptions are gone"""
+        self.vehicles.clear()
+
+    def update(self):
+        for v_id in traci.simulation.getDepartedIDList():
+            try:
+                vtype = traci.vehicle.getTypeID(v_id)
+            except traci.TraCIException:
+                continue
+
+            emergency = self._type_cache.get(vtype)
+            if emergency is None:
+                emergency = self._type_cache[vtype] = is_emergency_type(vtype)
+
+            if emergency:
+                # Keeps the VehicleTable variables: a new subscription may replace the old one
+                traci.vehicle.subscribe(v_id, VehicleTable.VARIABLES + (tc.VAR_NEXT_TLS,))
+                self.vehicles.add(v_id)
+
+        for v_id in traci.simulation.getArrivedIDList():
+            self.vehicles.discard(v_id)
+
+    def next_tls(self):
+        """Yields (vehicle_id, [(tls_id, link_index, distance, state), ...])"""
+        for v_id in self.vehicles:
+            results = traci.vehicle.getSubscriptionResults(v_id)
+            if results:
+                yield v_id, results.get(tc.VAR_NEXT_TLS, ())
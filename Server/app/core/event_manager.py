@@ -1,60 +1,158 @@
+import heapq
+import itertools
+import math
 import traci
 
+# Far-future end for events without one
+NO_END = 99999999
+
+# Vehicle classes a closed street is closed to (and reopened for)
+# "ambulance" is covered by "emergency". "car" is "passenger".
+CLOSED_TO = [
+    "passenger", "taxi", "bus", "truck", "trailer",
+    "motorcycle", "moped", "bicycle", "pedestrian",
+    "emergency", "delivery"
+]
+
+
+def event_times(start_time, end_time, now):
+    """
+    Validated (start, end) in simulation seconds: numbers (or numeric
+    strings), None for now / no end. Raises ValueError otherwise, or when
+    the event would end before it starts or has already ended at `now`.
+    """
+    times = []
+    for name, value, default in (("start_time", start_time, now), ("end_time", end_time, NO_END)):
+        if value is None:
+            times.append(default)
+            continue
+        try:
+            if isinstance(value, bool):
+                raise TypeError
+            value = float(value)
+        except (TypeError, ValueError):
+            raise ValueError(f"{name} must be a number of simulation seconds")
+        if not math.isfinite(value):
+            raise ValueError(f"{name} must be finite")
+        times.append(int(value) if value.is_integer() else value)
+
+    start, end = times
+    if end < start:
+        raise ValueError("end_time is before start_time")
+    if end <= now:
+        raise ValueError("end_time has already passed")
+    return start, end
+
+
 class EventManager:
+    """
+    Events keyed by ID and indexed by street; start/end transitions wait in a
+    min-heap, so a step only handles the transitions that are due.
+    """
+
     def __init__(self, sumo_manager):
         self.sumo = sumo_manager
         self.events = []
         self.event_id_counter = 1
-    
+        self.now = 0
+
+        self._by_id = {}  # str(id) -> event
+        self._by_street = {}  # street -> set of str(id)
+        self._transitions = []  # (time, seq, kind, str(id), event)
+        self._seq = itertools.count()
+
     # Updated signature to match routes.py call
-    def create_event(self, event_id, title, streets):
+    def create_event(self, event_id, title, streets, start_time=None, end_time=None):
+        start_time, end_time = event_times(start_time, end_time, self.now)
         event = {
             "id": event_id,
             "title": title,
             "streets": streets,
-            "status": "Active", # Default to Active since we close streets immediately
-            "start_time": 0,
-            "end_time": 0
+            "status": "Pending",
+            "start_time": start_time,
+            "end_time": end_time,
         }
-        self.events.append(event)
+        self._add_event(event)
         print(f"📅 Event Created - ID: {event_id}, Title: {title}, Streets: {len(streets)}")
         return event
 
+    def _add_event(self, event):
+        """Index and schedule an event; one that is already due activates now"""
+        key = str(event["id"])
+        self.events.append(event)
+        self._by_id[key] = event
+        for street in event["streets"]:
+            self._by_street.setdefault(street, set()).add(key)
+        self._schedule(event)
+        self.update_event_statuses(self.now)
+
+    def _schedule(self, event):
+        key = str(event["id"])
+        heapq.heappush(self._transitions, (event["start_time"], next(self._seq), "start", key, event))
+        heapq.heappush(self._transitions, (event["end_time"], next(self._seq), "end", key, event))
+
+    def _forget(self, event):
+        key = str(event["id"])
+        self.events.remove(event)
+        del self._by_id[key]
+        for street in event["streets"]:
+            ids = self._by_street.get(street)
+            if ids is not None:
+                ids.discard(key)
+                if not ids:
+                    del self._by_street[street]
+        # Its heap entries go stale and are skipped when popped
+
     def id_exists(self, event_id):
-        return any(e['id'] == event_id for e in self.events)
-    
+        return str(event_id) in self._by_id
+
     def update_event_statuses(self, current_time):
-        for event in self.events:
+        if current_time < self.now:
+            self._rewind(current_time)
+        self.now = current_time
+
+        closed = set()  # Enforced once for everything activated in this call
+        while self._transitions and self._transitions[0][0] <= current_time:
+            _, _, kind, key, event = heapq.heappop(self._transitions)
+            if self._by_id.get(key) is not event:
+                continue  # Removed (or replaced) since it was scheduled
+
             old_status = event.get("status", "Pending")
-            
-            if current_time < event["start_time"]:
-                new_status = "Pending"
-            elif current_time >= event["start_time"] and current_time < event["end_time"]:
+            if kind == "start" and old_status == "Pending":
                 new_status = "Active"
-            else:
+            elif kind == "end" and old_status in ("Pending", "Active"):
                 new_status = "Finished"
-            
-            if old_status != new_status:
-                event["status"] = new_status
-                print(f"✅ Event {event['id']}: {old_status} → {new_status}")
-                
-                if new_status == "Active":
-                    self._activate_event(event)
-                elif new_status == "Finished":
-                    self._deactivate_event(event)
-    
-    def _traci_close(self, street):
+            else:
+                continue
+
+            event["status"] = new_status
+            print(f"✅ Event {event['id']}: {old_status} → {new_status}")
+
+            if new_status == "Active":
+                closed |= self._activate_event(event, enforce=False)
+            else:
+                self._deactivate_event(event)
+
+        # Streets reopened later in the same batch need no enforcement
+        self.sumo.closures.streets_closed(closed & self.sumo.closed_streets)
+
+    def _rewind(self, current_time):
+        """Simulation went back in time (reset): rebuild the schedule from there"""
+        self._transitions = []
+        for event in self.events:
+            if event["start_time"] > current_time and event.get("status") == "Active":
+                self._deactivate_event(event)
+            event["status"] = "Pending"
+            self._schedule(event)
+        self.now = current_time
+
+    def _traci_close(self, street, enforce=True):
+        """Returns the closed street, or None; enforce=False leaves rerouting to the caller"""
         street = street.lstrip('+')
         try:
-            # Match socketio_handlers.py explicit list
-            # REMOVED invalid classes: ambulance, car, motorcycle_motorcycle, bus_bus, veh_passenger, truck_truck
-            # "ambulance" is covered by "emergency". "car" is "passenger".
-            disallowed_types = [
-                "passenger", "taxi", "bus", "truck", "trailer",
-                "motorcycle", "moped", "bicycle", "pedestrian",
-                "emergency", "delivery"
-            ]
-            traci.edge.setDisallowed(street, disallowed_types)
+            # Original permissions come back on reset (warm resets keep the network)
+            self.sumo.remember_street_permissions(street)
+            traci.edge.setDisallowed(street, CLOSED_TO)
             
             # Remove vehicles on this street
             for veh in traci.edge.getLastStepVehicleIDs(street):
@@ -64,20 +162,18 @@ class EventManager:
                     pass
                     
             self.sumo.closed_streets.add(street)
+            if enforce:
+                self.sumo.closures.street_closed(street)
             print(f"🚫 Closed: {street}")
+            return street
         except Exception as e:
             print(f"⚠️ Error closing {street}: {e}")
+            return None
 
     def _traci_open(self, street):
         street = street.lstrip('+')
         try:
-            # Match socketio_handlers.py explicit list
-            allowed_types = [
-                "passenger", "taxi", "bus", "truck", "trailer",
-                "motorcycle", "moped", "bicycle", "pedestrian",
-                "emergency", "delivery"
-            ]
-            traci.edge.setAllowed(street, allowed_types)
+            traci.edge.setAllowed(street, CLOSED_TO)
             self.sumo.closed_streets.discard(street)
             print(f"✅ Opened: {street}")
         except Exception as e:
@@ -87,12 +183,29 @@ class EventManager:
         """Closes a street physically without removing it from any event."""
         self._traci_close(street)
 
-    def _activate_event(self, event):
+    def force_open_street(self, street):
+        """Opens a street physically without touching any event."""
+        self._traci_open(street)
+
+    def clear_events(self):
+        self.events.clear()
+        self._by_id.clear()
+        self._by_street.clear()
+        self._transitions = []
+
+    def _activate_event(self, event, enforce=True):
+        """Closes the event's streets and reroutes around all of them at once"""
+        closed = set()
         for street in event["streets"]:
             # Robustness: Force close even if we think it's closed, 
             # to ensure vehicle removal and correct state.
             print(f"🚫 Event {event['id']}: Force Closing {street}")
-            self._traci_close(street)
+            street = self._traci_close(street, enforce=False)
+            if street is not None:
+                closed.add(street)
+        if enforce:
+            self.sumo.closures.streets_closed(closed)
+        return closed
     
     def _deactivate_event(self, event):
         print(f"🛑 Deactivating Event: {event['id']}")
@@ -104,41 +217,32 @@ class EventManager:
         
         event["status"] = "inactive"
     
+    def _detach_street(self, street):
+        """MANUAL close/open overrides events: the street leaves them"""
+        for key in self._by_street.pop(street, ()):
+            self._by_id[key]["streets"].remove(street)
+
     def handle_manual_close(self, street):
         # Ensure no + prefix
         street = street.lstrip('+')
-        
-        # MANUAL close removes it from events (override behavior)
-        for event in self.events:
-            if street in event["streets"]:
-                event["streets"].remove(street)
-        
+        self._detach_street(street)
         self._traci_close(street)
     
     def handle_manual_open(self, street):
         street = street.lstrip('+')
-        
-        for event in self.events:
-            if street in event["streets"]:
-                event["streets"].remove(street)
-        
+        self._detach_street(street)
         self._traci_open(street)
 
     def remove_event(self, event_id):
-        print(f"DEBUG: Attempting to remove event_id: '{event_id}' (Type: {type(event_id)})")
-        print(f"DEBUG: Base remove_event called on instance {id(self)}")
-        print(f"DEBUG: Current Events: {[{'id': e['id'], 'type': type(e['id']).__name__} for e in self.events]}")
-        
-        # Try finding exact match
-        event = next((e for e in self.events if str(e["id"]) == str(event_id)), None)
-        
+        event = self._by_id.get(str(event_id))
+
         if not event:
-            print("❌ Event not found in list.")
+            print(f"❌ Event not found: {event_id}")
             return False
             
         # Deactivate (open streets)
         self._deactivate_event(event) # Uses _traci_open internally
         
-        self.events.remove(event)
+        self._forget(event)
         print(f"🗑️ Removed Event: {event_id}")
         return True
@@ -0,0 +1,305 @@
+"""
+Recorded runs: a columnar archive of simulation frames, and its reader.
+
+A recording is a directory:
+
+    index.json          chunk list with time ranges, vehicle ID and type
+                        tables, traffic light heads, street catalogue
+    streets.geojson     street geometry, so replays need no SUMO network
+    chunk_00000.npz     np.savez_compressed columns for `chunk_frames` frames:
+        time      int64 (frames)        simulation second of each frame
+        offsets   int64 (frames + 1)    frame i's vehicles are [offsets[i], offsets[i + 1])
+        handles   uint32                index into index.json "vehicle_ids"
+        lon, lat  int32                 degrees * 1e7
+        angle     uint16                degrees * 100
+        types     uint8                 index into "types"
+        tls       uint8 (frames x heads) 0 green, 1 yellow, 2 red, 255 absent
+        kpis      float32 (frames x K)  avg_speed, waiting, then count /
+                                        avg_speed / waiting per KPI_TYPES
+        events    uint8                 JSON [[frame, events], ...] at changes
+
+Chunks are self-contained (each starts with the event list), so a reader
+seeks by loading a single chunk. index.json is rewritten after every chunk,
+which keeps an interrupted recording readable up to its last chunk.
+"""
+
+import bisect
+import json
+import os
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from .frame_stream import VEHICLE_TYPES
+
+POSITION_SCALE = 1e7
+ANGLE_SCALE = 100
+TLS_STATES = ("green", "yellow", "red")
+TLS_ABSENT = 255
+KPI_TYPES = list(VEHICLE_TYPES)
+KPI_FIELDS = ("count", "avg_speed", "waiting")
+
+
+class FrameRecorder:
+    """Appends every simulation step (turbo included) to a recording; a reset starts a new one"""
+
+    def __init__(self, sumo_manager, root, chunk_frames=600):
+        self.sumo = sumo_manager
+        self.root = root
+        self.chunk_frames = chunk_frames
+        self.path = None
+
+    @classmethod
+    def from_config(cls, sumo_manager, config):
+        recording = config.get("recording", {})
+        if not recording.get("enabled", False):
+            return None
+        return cls(sumo_manager, recording.get("path", "recordings"), recording.get("chunk_frames", 600))
+
+    # ---------------- RECORDING ----------------
+    def _open(self):
+        stamp = time.strftime("%Y%m%d-%H%M%S")
+        self.path = os.path.join(self.root, f"{self.sumo.label}-{stamp}")
+        os.makedirs(self.path, exist_ok=True)
+
+        geometry = self.sumo.street_geometry
+        if geometry is not None:
+            with open(os.path.join(self.path, "streets.geojson"), "wb") as f:
+                f.write(geometry.body)
+
+        self.index = {
+            "version": 1,
+            "created": stamp,
+            "mode": self.sumo.mode,
+            "chunks": [],
+            "vehicle_ids": [],
+            "types": list(VEHICLE_TYPES),
+            "kpi_types": KPI_TYPES,
+            "traffic_lights": [],  # [display_id, pos, angle]
+            "streets": list(self.sumo.available_streets),
+            "street_names": dict(self.sumo.street_names),
+            "street_total": geometry.total if geometry is not None else 0,
+        }
+        self._handles = {}
+        self._type_codes = {t: i for i, t in enumerate(self.index["types"])}
+        self._tls_columns = {}
+        self._last_time = None
+        self._new_chunk()
+        print(f"⏺️ Recording to {self.path}")
+
+    def _new_chunk(self):
+        self._time = []
+        self._offsets = [0]
+        self._columns = {"handles": [], "lon": [], "lat": [], "angle": [], "types": []}
+        self._tls = []
+        self._kpis = []
+        self._events = []
+        self._last_events = None
+
+    def record(self, step, vehicles, tl_data, events):
+        if self.path is None or (self._last_time is not None and step < self._last_time):
+            # Time went back (reset): this run is a new recording
+            self.close()
+            self._open()
+        self._last_time = step
+
+        n = len(vehicles)
+        handles = np.empty(n, dtype=np.uint32)
+        types = np.empty(n, dtype=np.uint8)
+        positions = np.empty((n, 2), dtype=np.float64)
+        angles = np.empty(n, dtype=np.float64)
+        for i, (v_id, veh) in enumerate(vehicles.items()):
+            handle = self._handles.get(v_id)
+            if handle is None:
+                handle = self._handles[v_id] = len(self.index["vehicle_ids"])
+                self.index["vehicle_ids"].append(v_id)
+            code = self._type_codes.get(veh["type"])
+            if code is None:
+                code = self._type_codes[veh["type"]] = len(self.index["types"])
+                self.index["types"].append(veh["type"])
+            handles[i] = handle
+            types[i] = code
+            positions[i] = veh["pos"]
+            angles[i] = veh["angle"]
+
+        columns = self._columns
+        columns["handles"].append(handles)
+        columns["types"].append(types)
+        columns["lon"].append(np.round(positions[:, 0] * POSITION_SCALE).astype(np.int32))
+        columns["lat"].append(np.round(positions[:, 1] * POSITION_SCALE).astype(np.int32))
+        columns["angle"].append(
+            (np.round(np.mod(angles, 360.0) * ANGLE_SCALE) % 36000).astype(np.uint16)
+        )
+        self._offsets.append(self._offsets[-1] + n)
+        self._time.append(step)
+
+        tls = {}
+        for display_id, head in tl_data["traffic_lights"].items():
+            column = self._tls_columns.get(display_id)
+            if column is None:
+                column = self._tls_columns[display_id] = len(self.index["traffic_lights"])
+                self.index["traffic_lights"].append([display_id, head["pos"], head["angle"]])
+            tls[column] = TLS_STATES.index(head["state"]) if head["state"] in TLS_STATES else TLS_ABSENT
+        self._tls.append(tls)
+
+        kpis = [tl_data["avg_speed"], tl_data["waiting"]]
+        for vtype in KPI_TYPES:
+            stats = tl_data["vehicle_stats"].get(vtype, {})
+            kpis.extend(stats.get(field, 0) for field in KPI_FIELDS)
+        self._kpis.append(kpis)
+
+        if events != self._last_events:
+            self._events.append([len(self._time) - 1, events])
+            self._last_events = events
+
+        if len(self._time) >= self.chunk_frames:
+            self.flush()
+
+    def flush(self):
+        """Write the buffered frames as the next chunk"""
+        if self.path is None or not self._time:
+            return
+
+        chunk = len(self.index["chunks"])
+        name = f"chunk_{chunk:05d}.npz"
+        tls = np.full((len(self._tls), len(self.index["traffic_lights"])), TLS_ABSENT, dtype=np.uint8)
+        for row, states in enumerate(self._tls):
+            for column, state in states.items():
+                tls[row, column] = state
+
+        np.savez_compressed(
+            os.path.join(self.path, name),
+            time=np.asarray(self._time, dtype=np.int64),
+            offsets=np.asarray(self._offsets, dtype=np.int64),
+            tls=tls,
+            kpis=np.asarray(self._kpis, dtype=np.float32),
+            events=np.frombuffer(json.dumps(self._events).encode(), dtype=np.uint8),
+            **{key: np.concatenate(parts) for key, parts in self._columns.items()},
+        )
+        self.index["chunks"].append(
+            {"file": name, "start": self._time[0], "end": self._time[-1], "frames": len(self._time)}
+        )
+        with open(os.path.join(self.path, "index.json"), "w") as f:
+            json.dump(self.index, f)
+        self._new_chunk()
+
+    def close(self):
+        if self.path is None:
+            return
+        try:
+            self.flush()
+            print(f"⏹️ Recording saved: {self.path}")
+        except Exception as e:
+            print(f"⚠️ Could not finish recording {self.path}: {e}")
+        self.path = None
+
+
+class FrameArchive:
+    """Reads a recording back as (step, vehicles, tl_data, events) snapshots"""
+
+    def __init__(self, path, cache_chunks=2):
+        self.path = path
+        with open(os.path.join(path, "index.json")) as f:
+            self.index = json.load(f)
+        self.chunks = self.index["chunks"]
+        if not self.chunks:
+            raise ValueError(f"Recording {path} has no frames")
+        self._starts = [c["start"] for c in self.chunks]
+        self._cache = OrderedDict()  # chunk number -> arrays, least recently used first
+        self.cache_chunks = cache_chunks
+
+        self.start = self.chunks[0]["start"]
+        self.end = self.chunks[-1]["end"]
+        self.vehicle_ids = self.index["vehicle_ids"]
+        self.types = self.index["types"]
+
+    @classmethod
+    def latest(cls, root):
+        """Most recent complete-enough recording under root"""
+        candidates = sorted(
+            (os.path.join(root, d) for d in os.listdir(root)),
+            key=os.path.getmtime,
+            reverse=True,
+        )
+        for path in candidates:
+            if os.path.exists(os.path.join(path, "index.json")):
+                return cls(path)
+        raise FileNotFoundError(f"No recordings in {root}")
+
+    def info(self):
+        return {
+            "recording": os.path.basename(self.path),
+            "mode": self.index.get("mode"),
+            "start": self.start,
+            "end": self.end,
+            "frames": sum(c["frames"] for c in self.chunks),
+        }
+
+    def street_geometry_body(self):
+        path = os.path.join(self.path, "streets.geojson")
+        if not os.path.exists(path):
+            return None
+        with open(path, "rb") as f:
+            return f.read()
+
+    def _chunk(self, number):
+        chunk = self._cache.get(number)
+        if chunk is not None:
+            self._cache.move_to_end(number)
+            return chunk
+
+        with np.load(os.path.join(self.path, self.chunks[number]["file"])) as data:
+            chunk = {key: data[key] for key in data.files}
+        chunk["events"] = json.loads(chunk["events"].tobytes())
+        if len(self._cache) >= self.cache_chunks:
+            self._cache.popitem(last=False)
+        self._cache[number] = chunk
+        return chunk
+
+    def frame_at(self, t):
+        """Snapshot of the last recorded frame at or before simulation second t"""
+        number = max(bisect.bisect_right(self._starts, t) - 1, 0)
+        chunk = self._chunk(number)
+        i = max(int(np.searchsorted(chunk["time"], t, side="right")) - 1, 0)
+
+        lo, hi = chunk["offsets"][i], chunk["offsets"][i + 1]
+        lon = (chunk["lon"][lo:hi] / POSITION_SCALE).tolist()
+        lat = (chunk["lat"][lo:hi] / POSITION_SCALE).tolist()
+        angle = (chunk["angle"][lo:hi] / ANGLE_SCALE).tolist()
+        vehicles = {
+            self.vehicle_ids[h]: {"pos": [x, y], "angle": a, "type": self.types[c]}
+            for h, x, y, a, c in zip(
+                chunk["handles"][lo:hi].tolist(), lon, lat, angle, chunk["types"][lo:hi].tolist()
+            )
+        }
+
+        traffic_lights = {}
+        for (display_id, pos, tl_angle), state in zip(self.index["traffic_lights"], chunk["tls"][i].tolist()):
+            if state != TLS_ABSENT:
+                traffic_lights[display_id] = {"pos": pos, "state": TLS_STATES[state], "angle": tl_angle}
+
+        kpis = chunk["kpis"][i].tolist()
+        vehicle_stats = {}
+        for k, vtype in enumerate(self.index["kpi_types"]):
+            count, avg_speed, waiting = kpis[2 + 3 * k:5 + 3 * k]
+            if count:
+                vehicle_stats[vtype] = {"count": int(count), "avg_speed": int(avg_speed), "waiting": int(waiting)}
+        amb = vehicle_stats.get("ambulance", {"count": 0, "avg_speed": 0, "waiting": 0})
+
+        events = []
+        for frame, frame_events in chunk["events"]:
+            if frame > i:
+                break
+            events = frame_events
+
+        tl_data = {
+            "traffic_lights": traffic_lights,
+            "avg_speed": int(kpis[0]),
+            "waiting": int(kpis[1]),
+            "amb_waiting": amb["waiting"],
+            "amb_count": amb["count"],
+            "amb_avg_speed": amb["avg_speed"],
+            "vehicle_stats": vehicle_stats,
+        }
+        return int(chunk["time"][i]), vehicles, tl_data, events
@@ -0,0 +1,400 @@
+"""
+Per-client simulation frame streaming.
+
+Clients start on the legacy "json" format (full `update` frame every step).
+A client can switch with the `frame_format` socket event:
+
+    "delta": a keyframe (kind="keyframe") with the full state, then frames
+             (kind="delta") carrying only added/moved vehicles in `vehicles`,
+             `removed` vehicle IDs, changed `traffic_lights` and `events` only
+             when they changed. Every frame has a `seq`; a client that sees a
+             gap emits `resync` and receives a keyframe of the current state.
+    "binary": vehicle IDs are interned to integer handles announced on the
+             `vehicle_dict` event; `update` frames (kind="binary") carry
+             little-endian typed arrays as Socket.IO binary attachments:
+             handles uint32, lon/lat int32 (degrees * 1e7), angle uint16
+             (degrees * 100) and types uint8 (index into the `types` table).
+
+A json or delta client can also send its map `viewport` (bounds and zoom).
+It then leaves the shared format room and gets its own frames with only the
+vehicles inside its bounds, looked up in a per-step VehicleGrid; below
+`aggregate_below_zoom` it gets per-cell counts (`vehicle_cells`) instead of
+individual vehicles. Delta viewport clients have their own encoder.
+"""
+
+import math
+
+import numpy as np
+
+from .loop_metrics import METRICS
+from .viewport import VehicleGrid
+
+JSON = "json"
+DELTA = "delta"
+BINARY = "binary"
+FRAME_FORMATS = (JSON, DELTA, BINARY)
+
+VEHICLE_TYPES = ["car", "bus", "motorcycle", "ambulance"]
+
+
+def frame_room(fmt):
+    return f"frames:{fmt}"
+
+
+class DeltaFrameEncoder:
+    """Keyframe/delta encoder shared by all delta clients"""
+
+    def __init__(self, keyframe_interval=50, position_epsilon=1e-5, angle_epsilon=2.0):
+        self.keyframe_interval = keyframe_interval
+        self.position_epsilon = position_epsilon
+        self.angle_epsilon = angle_epsilon
+
+        self.seq = 0
+        self._force_keyframe = True
+
+        # State as last sent, i.e. what every in-sync client holds
+        self._vehicles = {}
+        self._traffic_lights = {}
+        self._events = []
+
+    def request_keyframe(self):
+        self._force_keyframe = True
+
+    def encode(self, vehicles, traffic_lights, events, stats):
+        self.seq += 1
+
+        if self._force_keyframe or self.seq % self.keyframe_interval == 0:
+            self._force_keyframe = False
+            self._vehicles = dict(vehicles)
+            self._traffic_lights = dict(traffic_lights)
+            self._events = events
+            return self.keyframe(stats)
+
+        changed_vehicles = {}
+        for v_id, veh in vehicles.items():
+            sent = self._vehicles.get(v_id)
+            if sent is None or self._moved(sent, veh):
+                changed_vehicles[v_id] = veh
+                self._vehicles[v_id] = veh
+
+        removed = [v_id for v_id in self._vehicles if v_id not in vehicles]
+        for v_id in removed:
+            del self._vehicles[v_id]
+
+        changed_tls = {}
+        for tl_id, tl in traffic_lights.items():
+            sent = self._traffic_lights.get(tl_id)
+            if sent is None or sent["state"] != tl["state"]:
+                changed_tls[tl_id] = tl
+                self._traffic_lights[tl_id] = tl
+
+        frame = {
+            "kind": "delta",
+            "seq": self.seq,
+            "vehicles": changed_vehicles,
+            "removed": removed,
+            "traffic_lights": changed_tls,
+            **stats,
+        }
+
+        if events != self._events:
+            self._events = events
+            frame["events"] = events
+
+        return frame
+
+    def keyframe(self, stats):
+        """Full frame of the last sent state (also used to resync one client)"""
+        return {
+            "kind": "keyframe",
+            "seq": self.seq,
+            "vehicles": self._vehicles,
+            "removed": [],
+            "traffic_lights": self._traffic_lights,
+            "events": self._events,
+            **stats,
+        }
+
+    def _moved(self, sent, veh):
+        (lon0, lat0), (lon1, lat1) = sent["pos"], veh["pos"]
+        return (
+            abs(lon1 - lon0) > self.position_epsilon
+            or abs(lat1 - lat0) > self.position_epsilon
+            or abs(veh["angle"] - sent["angle"]) > self.angle_epsilon
+            or veh["type"] != sent["type"]
+        )
+
+
+class BinaryFrameEncoder:
+    """Packs vehicle state into typed arrays keyed by interned integer handles"""
+
+    POSITION_SCALE = 1e7
+    ANGLE_SCALE = 100
+
+    def __init__(self):
+        self.seq = 0
+        self.handles = {}  # vehicle ID -> handle
+        self.types = list(VEHICLE_TYPES)
+        self._type_codes = {t: i for i, t in enumerate(self.types)}
+        self._next_handle = 0
+
+    def dictionary(self):
+        """Full handle/type tables for a client that just switched to binary"""
+        return {
+            "reset": True,
+            "seq": self.seq,
+            "add": {h: v_id for v_id, h in self.handles.items()},
+            "remove": [],
+            "types": self.types,
+        }
+
+    def encode(self, vehicles, traffic_lights, events, stats):
+        """Returns (dictionary update or None, frame)"""
+        self.seq += 1
+        n = len(vehicles)
+
+        handles = np.empty(n, dtype="<u4")
+        lon = np.empty(n, dtype=np.float64)
+        lat = np.empty(n, dtype=np.float64)
+        angle = np.empty(n, dtype=np.float64)
+        types = np.empty(n, dtype=np.uint8)
+
+        added = {}
+        types_changed = False
+        for i, (v_id, veh) in enumerate(vehicles.items()):
+            handle = self.handles.get(v_id)
+            if handle is None:
+                handle = self._next_handle
+                self._next_handle += 1
+                self.handles[v_id] = handle
+                added[handle] = v_id
+
+            code = self._type_codes.get(veh["type"])
+            if code is None:
+                code = len(self.types)
+                self.types.append(veh["type"])
+                self._type_codes[veh["type"]] = code
+                types_changed = True
+
+            handles[i] = handle
+            lon[i], lat[i] = veh["pos"]
+            angle[i] = veh["angle"]
+            types[i] = code
+
+        # Every current vehicle has a handle now, so any surplus has left
+        removed = []
+        if len(self.handles) > n:
+            for v_id in [v for v in self.handles if v not in vehicles]:
+                removed.append(self.handles.pop(v_id))
+
+        update = None
+        if added or removed or types_changed:
+            update = {
+                "reset": False,
+                "seq": self.seq,
+                "add": added,
+                "remove": removed,
+                "types": self.types,
+            }
+
+        frame = {
+            "kind": "binary",
+            "seq": self.seq,
+            "count": n,
+            "handles": handles.tobytes(),
+            "lon": np.round(lon * self.POSITION_SCALE).astype("<i4").tobytes(),
+            "lat": np.round(lat * self.POSITION_SCALE).astype("<i4").tobytes(),
+            "angle": (np.round(np.mod(angle, 360.0) * self.ANGLE_SCALE) % 36000)
+            .astype("<u2")
+            .tobytes(),
+            "types": types.tobytes(),
+            "traffic_lights": traffic_lights,
+            "events": events,
+            **stats,
+        }
+        return update, frame
+
+
+class FrameStream:
+    """Tracks each client's frame format and emits `update` frames per format"""
+
+    def __init__(self, socketio, config=None, room_prefix=""):
+        self.socketio = socketio
+        self.room_prefix = room_prefix  # keeps rooms of separate sessions apart
+        streaming = (config or {}).get("streaming", {})
+
+        self.formats = {}  # sid -> format
+        self.viewports = {}  # sid -> {"bounds", "zoom", "delta"}
+        self.heatmap_clients = set()
+        self._delta_options = {
+            "keyframe_interval": streaming.get("keyframe_interval", 50),
+            "position_epsilon": streaming.get("delta_position_epsilon", 1e-5),
+            "angle_epsilon": streaming.get("delta_angle_epsilon", 2.0),
+        }
+        self.delta = DeltaFrameEncoder(**self._delta_options)
+        self.binary = BinaryFrameEncoder()
+        self.grid_cell_size = streaming.get("grid_cell_deg", 0.002)
+        self.aggregate_below_zoom = streaming.get("aggregate_below_zoom", 15)
+        self._last_stats = {}
+
+    def _room(self, fmt):
+        return self.room_prefix + frame_room(fmt)
+
+    # ---------------- CLIENTS ----------------
+    def add_client(self, sid):
+        self.set_format(sid, JSON)
+
+    def remove_client(self, sid):
+        self.viewports.pop(sid, None)
+        self.set_heatmap(sid, False)
+        fmt = self.formats.pop(sid, None)
+        if fmt:
+            self.socketio.server.leave_room(sid, self._room(fmt), namespace="/")
+
+    def set_format(self, sid, fmt):
+        if fmt not in FRAME_FORMATS:
+            return False
+
+        old = self.formats.get(sid)
+        if old:
+            self.socketio.server.leave_room(sid, self._room(old), namespace="/")
+        self.formats[sid] = fmt
+
+        viewport = self.viewports.get(sid)
+        if viewport and fmt == BINARY:
+            # Binary handles are shared by all clients; no per-client variant
+            del self.viewports[sid]
+        elif viewport:
+            viewport["delta"] = DeltaFrameEncoder(**self._delta_options) if fmt == DELTA else None
+            return True
+
+        self.socketio.server.enter_room(sid, self._room(fmt), namespace="/")
+
+        if fmt == DELTA:
+            self.resync(sid)
+        elif fmt == BINARY:
+            self.socketio.emit("vehicle_dict", self.binary.dictionary(), to=sid)
+        return True
+
+    def set_viewport(self, sid, bounds, zoom):
+        """Stream only what is inside bounds=(south, west, north, east) to this client"""
+        fmt = self.formats.get(sid)
+        if fmt not in (JSON, DELTA):
+            return False
+
+        viewport = self.viewports.get(sid)
+        if viewport is None:
+            self.socketio.server.leave_room(sid, self._room(fmt), namespace="/")
+            viewport = self.viewports[sid] = {
+                "delta": DeltaFrameEncoder(**self._delta_options) if fmt == DELTA else None
+            }
+        viewport["bounds"] = bounds
+        viewport["zoom"] = zoom
+        return True
+
+    def clear_viewport(self, sid):
+        """Back to the shared full-network stream"""
+        if self.viewports.pop(sid, None) is None:
+            return
+        fmt = self.formats[sid]
+        self.socketio.server.enter_room(sid, self._room(fmt), namespace="/")
+        if fmt == DELTA:
+            self.resync(sid)
+
+    def resync(self, sid):
+        """Send one client a keyframe matching the shared delta baseline"""
+        viewport = self.viewports.get(sid)
+        if viewport and viewport["delta"]:
+            viewport["delta"].request_keyframe()
+            return
+        self.socketio.emit("update", self.delta.keyframe(self._last_stats), to=sid)
+
+    def set_heatmap(self, sid, enabled):
+        """Subscribe a client to periodic `heatmap` grids (independent of its frame format)"""
+        if enabled and sid not in self.heatmap_clients:
+            self.heatmap_clients.add(sid)
+            self.socketio.server.enter_room(sid, self.room_prefix + "heatmap", namespace="/")
+        elif not enabled and sid in self.heatmap_clients:
+            self.heatmap_clients.discard(sid)
+            self.socketio.server.leave_room(sid, self.room_prefix + "heatmap", namespace="/")
+
+    def has_clients(self, fmt):
+        return any(f == fmt and sid not in self.viewports for sid, f in self.formats.items())
+
+    # ---------------- FRAMES ----------------
+    def publish(self, step, vehicles, tl_data, events):
+        stats = {
+            "time": step,
+            "avg_speed": tl_data["avg_speed"],
+            "waiting": tl_data["waiting"],
+            # Legacy Ambulance Stats
+            "amb_waiting": tl_data["amb_waiting"],
+            "amb_count": tl_data["amb_count"],
+            "amb_avg_speed": tl_data["amb_avg_speed"],
+            "vehicle_stats": tl_data["vehicle_stats"],
+        }
+        self._last_stats = stats
+        traffic_lights = tl_data["traffic_lights"]
+
+        if self.has_clients(JSON):
+            frame = {
+                "vehicles": vehicles,
+                "traffic_lights": traffic_lights,
+                "events": events,
+                **stats,
+            }
+            METRICS.sample_frame(JSON, frame)
+            self.socketio.emit("update", frame, to=self._room(JSON))
+
+        if self.has_clients(DELTA):
+            frame = self.delta.encode(vehicles, traffic_lights, events, stats)
+            METRICS.sample_frame(DELTA, frame)
+            self.socketio.emit("update", frame, to=self._room(DELTA))
+        else:
+            # Nobody holds the baseline; start the next delta client from scratch
+            self.delta.request_keyframe()
+
+        if self.has_clients(BINARY):
+            update, frame = self.binary.encode(vehicles, traffic_lights, events, stats)
+            if update:
+                self.socketio.emit("vehicle_dict", update, to=self._room(BINARY))
+            METRICS.sample_frame(BINARY, frame)
+            self.socketio.emit("update", frame, to=self._room(BINARY))
+
+        if self.viewports:
+            self._publish_viewports(vehicles, traffic_lights, events, stats)
+
+    def publish_heatmap(self, grid):
+        if grid is not None:
+            self.socketio.emit("heatmap", grid, to=self.room_prefix + "heatmap")
+
+    def _publish_viewports(self, vehicles, traffic_lights, events, stats):
+        grid = VehicleGrid.from_vehicles(vehicles, self.grid_cell_size)
+
+        for sid, viewport in list(self.viewports.items()):
+            bounds = viewport["bounds"]
+            cells = None
+            if viewport["zoom"] < self.aggregate_below_zoom:
+                # Each zoom level out doubles the aggregation cell (fractional
+                # map zooms round down to the level they are in)
+                levels = self.aggregate_below_zoom - 1 - int(math.floor(viewport["zoom"]))
+                factor = 2 ** min(max(levels, 0), 6)
+                cells = grid.cell_counts(bounds, factor)
+                visible = {}
+            else:
+                visible = {grid.ids[i]: vehicles[grid.ids[i]] for i in grid.query(bounds)}
+
+            if viewport["delta"]:
+                frame = viewport["delta"].encode(visible, traffic_lights, events, stats)
+            else:
+                frame = {
+                    "vehicles": visible,
+                    "traffic_lights": traffic_lights,
+                    "events": events,
+                    **stats,
+                }
+
+            if cells is not None:
+                frame["vehicle_cells"] = cells
+                frame["cell_size"] = self.grid_cell_size * factor
+            self.socketio.emit("update", frame, to=sid)
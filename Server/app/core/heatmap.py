@@ -0,0 +1,96 @@
+import numpy as np
+
+
+class DensityHeatmap:
+    """
+    Vehicle density on a fixed lat/lon grid over the simulation bounds.
+    Every simulation step (turbo included) bins all vehicle positions at once
+    (histogram2d) and adds them to the grid after decaying it by 0.5 per
+    `half_life` simulated seconds, so the grid shows where traffic has been
+    recently, not just now.
+    """
+
+    def __init__(self, bounds, cell_deg=0.0005, half_life=60):
+        self.south, self.west, self.north, self.east = bounds
+        self.cell_deg = cell_deg
+        self.half_life = half_life
+
+        self.lat_edges = np.arange(self.south, self.north + cell_deg, cell_deg)
+        self.lon_edges = np.arange(self.west, self.east + cell_deg, cell_deg)
+        self.grid = np.zeros((len(self.lat_edges) - 1, len(self.lon_edges) - 1))
+        self.time = None
+
+    @classmethod
+    def from_config(cls, config, projection=None):
+        """
+        Grid over simulation.bounds; over the network's own boundary (via the
+        projection) when those are missing or do not overlap the network.
+        """
+        b = config.get("simulation", {}).get("bounds") or {}
+        bounds = None
+        if all(k in b for k in ("min_lat", "min_lon", "max_lat", "max_lon")):
+            bounds = (b["min_lat"], b["min_lon"], b["max_lat"], b["max_lon"])
+            if bounds[0] >= bounds[2] or bounds[1] >= bounds[3]:
+                bounds = None
+
+        network = projection.geo_bounds() if projection is not None else None
+        if network is not None and (bounds is None or not _overlap(bounds, network)):
+            reason = "do not overlap the network" if bounds is not None else "are not set"
+            print(f"⚠️ Heatmap: simulation.bounds {reason}; using the network boundary {_fmt(network)}")
+            bounds = network
+        elif bounds is None:
+            print("⚠️ Heatmap: no simulation.bounds and no network boundary; the grid stays empty")
+            bounds = (0.0, 0.0, 0.0, 0.0)
+
+        heatmap = config.get("heatmap", {})
+        return cls(bounds, heatmap.get("cell_deg", 0.0005), heatmap.get("half_life", 60))
+
+    def clear(self):
+        self.grid[:] = 0
+        self.time = None
+
+    def record(self, step, positions):
+        """Decay to `step` and add this step's vehicles ((N, 2) array of lon, lat)"""
+        if self.time is not None:
+            if step < self.time:
+                self.clear()  # Reset: start over
+            elif step > self.time:
+                self.grid *= 0.5 ** ((step - self.time) / self.half_life)
+        self.time = step
+
+        positions = np.asarray(positions, dtype=np.float64).reshape(-1, 2)
+        if not len(positions):
+            return
+        counts, _, _ = np.histogram2d(
+            positions[:, 1], positions[:, 0], bins=(self.lat_edges, self.lon_edges)
+        )
+        self.grid += counts
+
+    def snapshot(self, min_value=0.05):
+        """Compact grid: non-empty cells as [row, col, intensity 1-255] scaled to `max`"""
+        peak = float(self.grid.max()) if self.grid.size else 0.0
+        result = {
+            "time": self.time,
+            "bounds": [self.south, self.west, self.north, self.east],
+            "cell_deg": self.cell_deg,
+            "rows": self.grid.shape[0],
+            "cols": self.grid.shape[1],
+            "max": round(peak, 2),
+            "cells": [],
+        }
+        if peak <= 0:
+            return result
+
+        rows, cols = np.nonzero(self.grid >= min_value)
+        intensity = np.ceil(self.grid[rows, cols] / peak * 255).astype(np.int64)
+        result["cells"] = np.column_stack((rows, cols, intensity)).tolist()
+        return result
+
+
+def _overlap(a, b):
+    """Whether two (south, west, north, east) boxes intersect"""
+    return a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]
+
+
+def _fmt(bounds):
+    return "(" + ", ".join(f"{v:.5f}" for v in bounds) + ")"
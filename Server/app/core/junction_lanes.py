@@ -0,0 +1,81 @@
+import numpy as np
+import traci
+import traci.constants as tc
+
+
+class JunctionLaneIndex:
+    """
+    Controlled incoming lanes of each signalised junction, with one lane
+    subscription (halting vehicles, vehicles, waiting time) shared by
+    everything that needs per-junction traffic figures.
+    """
+
+    VARIABLES = (
+        tc.LAST_STEP_VEHICLE_HALTING_NUMBER,
+        tc.LAST_STEP_VEHICLE_NUMBER,
+        tc.VAR_WAITING_TIME,
+    )
+    FIELDS = ("queue", "vehicles", "waiting")
+
+    def __init__(self, lanes_by_junction):
+        # junction -> [lane_id, ...] in signal link order
+        self.lanes_by_junction = lanes_by_junction
+        self.junctions = list(lanes_by_junction)
+        self.lanes = [lane for lanes in lanes_by_junction.values() for lane in lanes]
+        self._owner = np.repeat(
+            np.arange(len(self.junctions)), [len(l) for l in lanes_by_junction.values()]
+        )
+
+    @classmethod
+    def build(cls, tls_ids):
+        lanes_by_junction = {}
+        for tl_id in sorted(tls_ids):
+            try:
+                controlled = traci.trafficlight.getControlledLanes(tl_id)
+            except traci.TraCIException:
+                continue
+            # Each lane appears once per link it feeds
+            lanes = list(dict.fromkeys(l for l in controlled if not l.startswith(":")))
+            if lanes:
+                lanes_by_junction[tl_id] = lanes
+
+        index = cls(lanes_by_junction)
+        index.subscribe()
+        return index
+
+    def subscribe(self):
+        for lane_id in self.lanes:
+            traci.lane.subscribe(lane_id, self.VARIABLES)
+
+    def lane_values(self):
+        """(lanes x FIELDS) array from this step's subscription results"""
+        results = traci.lane.getAllSubscriptionResults()
+        values = np.zeros((len(self.lanes), len(self.VARIABLES)), dtype=np.float64)
+        for i, lane_id in enumerate(self.lanes):
+            lane = results.get(lane_id)
+            if lane:
+                values[i] = [lane.get(v, 0) for v in self.VARIABLES]
+        return values
+
+    def lane_slots(self, junctions, width):
+        """
+        (len(junctions) x width) rows into lane_values(): each junction's first
+        `width` lanes in link order, -1 where it has fewer (or is not indexed)
+        """
+        slots = np.full((len(junctions), width), -1, dtype=np.int64)
+        starts = np.cumsum([0] + [len(l) for l in self.lanes_by_junction.values()])
+        position = {j: k for k, j in enumerate(self.junctions)}
+        for row, junction_id in enumerate(junctions):
+            k = position.get(junction_id)
+            if k is not None:
+                count = min(width, starts[k + 1] - starts[k])
+                slots[row, :count] = np.arange(starts[k], starts[k] + count)
+        return slots
+
+    def junction_totals(self, lane_values=None):
+        """(junctions x FIELDS) sums over each junction's lanes"""
+        if lane_values is None:
+            lane_values = self.lane_values()
+        totals = np.zeros((len(self.junctions), len(self.VARIABLES)), dtype=np.float64)
+        np.add.at(totals, self._owner, lane_values)
+        return totals
@@ -0,0 +1,116 @@
+import numpy as np
+
+from .frame_stream import VEHICLE_TYPES
+from .junction_lanes import JunctionLaneIndex
+
+GLOBAL_FIELDS = ("vehicles", "avg_speed", "waiting")
+TYPE_FIELDS = ("count", "avg_speed", "waiting")
+JUNCTION_FIELDS = JunctionLaneIndex.FIELDS
+
+
+class KPIHistory:
+    """
+    Fixed-size NumPy ring buffers of per-step KPIs (global, per vehicle type,
+    per junction). Queries return min/max/mean per time bucket, so a client
+    can load hours of history in one small response.
+    """
+
+    def __init__(self, capacity=7200, junctions=()):
+        self.capacity = capacity
+        self.types = list(VEHICLE_TYPES)
+        self.junctions = list(junctions)
+
+        self.time = np.zeros(capacity, dtype=np.int64)
+        self.global_kpis = np.zeros((capacity, len(GLOBAL_FIELDS)), dtype=np.float32)
+        self.type_kpis = np.zeros((capacity, len(self.types), len(TYPE_FIELDS)), dtype=np.float32)
+        self.junction_kpis = np.zeros(
+            (capacity, len(self.junctions), len(JUNCTION_FIELDS)), dtype=np.float32
+        )
+        self.head = 0
+        self.size = 0
+
+    def clear(self):
+        self.head = 0
+        self.size = 0
+
+    def record(self, step, tl_data, junction_totals=None):
+        # Time went back (reset): the old run's history no longer applies
+        if self.size and step < self.time[(self.head - 1) % self.capacity]:
+            self.clear()
+
+        i = self.head
+        self.time[i] = step
+        vehicle_stats = tl_data["vehicle_stats"]
+        self.global_kpis[i] = (
+            sum(s["count"] for s in vehicle_stats.values()),
+            tl_data["avg_speed"],
+            tl_data["waiting"],
+        )
+        self.type_kpis[i] = 0
+        for t, vtype in enumerate(self.types):
+            stats = vehicle_stats.get(vtype)
+            if stats:
+                self.type_kpis[i, t] = [stats[f] for f in TYPE_FIELDS]
+        if junction_totals is not None and len(self.junctions):
+            self.junction_kpis[i] = junction_totals
+
+        self.head = (self.head + 1) % self.capacity
+        self.size = min(self.size + 1, self.capacity)
+
+    def query(self, t_from=None, t_to=None, resolution=1, junctions=None):
+        """Downsampled series between t_from and t_to (simulation seconds)"""
+        result = {"from": t_from, "to": t_to, "resolution": resolution, "time": []}
+        if not self.size:
+            return result
+
+        order = (self.head - self.size + np.arange(self.size)) % self.capacity
+        times = self.time[order]
+        t_from = int(times[0]) if t_from is None else t_from
+        t_to = int(times[-1]) if t_to is None else t_to
+        result.update({"from": t_from, "to": t_to})
+
+        selected = order[(times >= t_from) & (times <= t_to)]
+        if not len(selected):
+            return result
+
+        buckets = (self.time[selected] - t_from) // resolution
+        starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+        result["time"] = (t_from + buckets[starts] * resolution).tolist()
+
+        def series(values):
+            counts = np.diff(np.r_[starts, len(values)]).reshape((-1,) + (1,) * (values.ndim - 1))
+            return (
+                np.minimum.reduceat(values, starts, axis=0),
+                np.maximum.reduceat(values, starts, axis=0),
+                np.add.reduceat(values.astype(np.float64), starts, axis=0) / counts,
+            )
+
+        def fields(stats, names):
+            return {
+                name: {
+                    key: np.round(s[:, k], 2).tolist()
+                    for key, s in zip(("min", "max", "mean"), stats)
+                }
+                for k, name in enumerate(names)
+            }
+
+        result["global"] = fields(series(self.global_kpis[selected]), GLOBAL_FIELDS)
+
+        type_stats = series(self.type_kpis[selected])
+        result["vehicle_types"] = {
+            vtype: fields([s[:, t] for s in type_stats], TYPE_FIELDS)
+            for t, vtype in enumerate(self.types)
+        }
+
+        wanted = [
+            (j, jid) for j, jid in enumerate(self.junctions) if junctions is None or jid in junctions
+        ]
+        if wanted:
+            junction_stats = series(self.junction_kpis[selected][:, [j for j, _ in wanted]])
+            result["junctions"] = {
+                jid: fields([s[:, k] for s in junction_stats], JUNCTION_FIELDS)
+                for k, (_, jid) in enumerate(wanted)
+            }
+        else:
+            result["junctions"] = {}
+        return result
@@ -0,0 +1,257 @@
+"""
+Simulation-loop metrics in Prometheus text exposition format (`/metrics`).
+
+One LoopMetrics per process (METRICS). It records only while someone is
+scraping: every scrape marks it active for `metrics.scrape_idle` seconds,
+and each loop iteration refreshes the flag once with tick(). While inactive
+the hooks below are a single attribute check.
+
+    step phases:  vegha_step_seconds{phase} histogram
+                  sumo (simulationStep), control (events, closures, signals),
+                  extract (vehicle state + KPI recording), emit (frames)
+    TraCI:        vegha_traci_calls_total{command, variable}, counted in
+                  traci's Connection._sendCmd (every TraCI request passes it)
+    frames:       vegha_frame_bytes{format} histogram, one frame in
+                  `payload_sample_every` measured
+    gauges:       vegha_vehicles, plus vegha_connected_clients and
+                  vegha_events per session (added by the route)
+
+Worker processes keep their own METRICS; the route fetches them with the
+`metrics` worker command (all workers at once, skipping any that miss
+`worker.metrics_timeout`) and labels them with the session.
+"""
+
+import bisect
+import json
+import time
+
+STEP_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+BYTE_BUCKETS = (1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def samples(self, labels):
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+            cumulative += count
+            le = "+Inf" if bound == float("inf") else repr(bound)
+            yield "_bucket", {**labels, "le": le}, cumulative
+        yield "_sum", labels, self.sum
+        yield "_count", labels, self.count
+
+
+class _Phase:
+    """Context manager timing one step phase"""
+
+    __slots__ = ("metrics", "name", "started")
+
+    def __init__(self, metrics, name):
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+
+    def __exit__(self, *exc):
+        self.metrics.observe_phase(self.name, time.perf_counter() - self.started)
+
+
+class _NoPhase:
+    def __enter__(self):
+        pass
+
+    def __exit__(self, *exc):
+        pass
+
+
+_NO_PHASE = _NoPhase()
+
+
+class LoopMetrics:
+    def __init__(self, scrape_idle=120, payload_sample_every=10):
+        self.scrape_idle = scrape_idle
+        self.payload_sample_every = payload_sample_every
+        self.enabled = False
+        self._last_scrape = None
+        self._traci_instrumented = False
+        self.reset()
+
+    def configure(self, config):
+        metrics = config.get("metrics", {})
+        self.scrape_idle = metrics.get("scrape_idle", self.scrape_idle)
+        self.payload_sample_every = metrics.get("payload_sample_every", self.payload_sample_every)
+
+    def reset(self):
+        """Drop all recorded values"""
+        self.phases = {}  # phase -> Histogram
+        self.frame_bytes = {}  # format -> Histogram
+        self.traci_calls = {}  # (command id, variable id) -> count
+        self.vehicles = None
+        self._frames_seen = 0
+
+    # ---------------- RECORDING ----------------
+    def tick(self):
+        """Refresh `enabled` once per loop iteration"""
+        self.enabled = (
+            self._last_scrape is not None
+            and time.monotonic() - self._last_scrape < self.scrape_idle
+        )
+        return self.enabled
+
+    def phase(self, name):
+        return _Phase(self, name) if self.enabled else _NO_PHASE
+
+    def observe_phase(self, name, seconds):
+        histogram = self.phases.get(name)
+        if histogram is None:
+            histogram = self.phases[name] = Histogram(STEP_BUCKETS)
+        histogram.observe(seconds)
+
+    def set_vehicles(self, count):
+        if self.enabled:
+            self.vehicles = count
+
+    def sample_frame(self, fmt, frame):
+        """Measure every payload_sample_every-th frame's encoded size"""
+        if not self.enabled:
+            return
+        self._frames_seen += 1
+        if self._frames_seen % self.payload_sample_every:
+            return
+
+        size = 0
+        rest = {}
+        for key, value in frame.items():
+            if isinstance(value, bytes):
+                size += len(value)  # Socket.IO binary attachment
+            else:
+                rest[key] = value
+        size += len(json.dumps(rest, separators=(",", ":"), default=str))
+
+        histogram = self.frame_bytes.get(fmt)
+        if histogram is None:
+            histogram = self.frame_bytes[fmt] = Histogram(BYTE_BUCKETS)
+        histogram.observe(size)
+
+    def instrument_traci(self):
+        """Count TraCI requests by command/variable; once per process"""
+        if self._traci_instrumented:
+            return
+        self._traci_instrumented = True
+        try:
+            from traci.connection import Connection
+        except ImportError:
+            return
+        send = getattr(Connection, "_sendCmd", None)
+        if send is None:
+            print("⚠️ TraCI call metrics unavailable for this traci version")
+            return
+
+        metrics = self
+
+        def _sendCmd(conn, cmdID, varID, *args, **kwargs):
+            if metrics.enabled:
+                key = (cmdID, varID)
+                metrics.traci_calls[key] = metrics.traci_calls.get(key, 0) + 1
+            return send(conn, cmdID, varID, *args, **kwargs)
+
+        Connection._sendCmd = _sendCmd
+
+    # ---------------- EXPOSITION ----------------
+    def collect(self):
+        """Marks a scrape; returns {family: (type, help, [(suffix, labels, value)])}"""
+        self._last_scrape = time.monotonic()
+        self.enabled = True
+
+        families = {}
+        if self.phases:
+            families["vegha_step_seconds"] = (
+                "histogram",
+                "Simulation loop time per step phase",
+                [s for name, h in sorted(self.phases.items()) for s in h.samples({"phase": name})],
+            )
+        if self.frame_bytes:
+            families["vegha_frame_bytes"] = (
+                "histogram",
+                "Encoded update frame size (sampled)",
+                [s for fmt, h in sorted(self.frame_bytes.items()) for s in h.samples({"format": fmt})],
+            )
+        if self.traci_calls:
+            families["vegha_traci_calls_total"] = (
+                "counter",
+                "TraCI requests by command and variable id",
+                [
+                    ("", {"command": _command_name(cmd), "variable": _hex(var)}, count)
+                    for (cmd, var), count in sorted(self.traci_calls.items(), key=str)
+                ],
+            )
+        if self.vehicles is not None:
+            families["vegha_vehicles"] = (
+                "gauge",
+                "Vehicles in the simulation at the last extracted step",
+                [("", {}, self.vehicles)],
+            )
+        return families
+
+
+_COMMANDS = None
+
+
+def _command_name(cmd):
+    global _COMMANDS
+    if _COMMANDS is None:
+        try:
+            import traci.constants as tc
+
+            _COMMANDS = {
+                v: k for k, v in vars(tc).items() if k.startswith("CMD_") and isinstance(v, int)
+            }
+        except ImportError:
+            _COMMANDS = {}
+    return _COMMANDS.get(cmd, _hex(cmd))
+
+
+def _hex(value):
+    return "" if value is None else f"0x{value:02x}"
+
+
+def merge(families, more, labels=None):
+    """Add another collect() result, with extra labels on every sample"""
+    for name, (kind, help_text, samples) in more.items():
+        if labels:
+            samples = [(suffix, {**labels, **l}, v) for suffix, l, v in samples]
+        if name in families:
+            families[name][2].extend(samples)
+        else:
+            families[name] = (kind, help_text, list(samples))
+    return families
+
+
+def exposition(families):
+    """Prometheus text format 0.0.4"""
+    lines = []
+    for name, (kind, help_text, samples) in families.items():
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        for suffix, labels, value in samples:
+            label_text = ",".join(
+                '{}="{}"'.format(k, str(v).replace("\\", "\\\\").replace('"', '\\"'))
+                for k, v in labels.items()
+            )
+            label_text = "{" + label_text + "}" if label_text else ""
+            lines.append(f"{name}{suffix}{label_text} {value}")
+    return "\n".join(lines) + "\n"
+
+
+METRICS = LoopMetrics()
@@ -0,0 +1,223 @@
+import gzip
+import math
+import os
+import xml.etree.ElementTree as ET
+
+import numpy as np
+
+try:
+    from pyproj import CRS, Transformer
+except ImportError:
+    Transformer = None
+
+# (a, f) for the ellipsoids SUMO / OSM networks use in practice
+ELLIPSOIDS = {
+    "WGS84": (6378137.0, 1 / 298.257223563),
+    "GRS80": (6378137.0, 1 / 298.257222101),
+}
+
+
+def read_net_location(net_file):
+    """The <location> element attributes of a (possibly gzipped) .net.xml"""
+    opener = gzip.open if net_file.endswith(".gz") else open
+    with opener(net_file, "rb") as f:
+        for _, elem in ET.iterparse(f, events=("start",)):
+            if elem.tag == "location":
+                return dict(elem.attrib)
+    return {}
+
+
+def net_file_from_sumocfg(sumocfg):
+    root = ET.parse(sumocfg).getroot()
+    for elem in root.iter("net-file"):
+        return os.path.join(os.path.dirname(sumocfg), elem.get("value").strip())
+    raise ValueError(f"No net-file in {sumocfg}")
+
+
+def _proj_params(proj_parameter):
+    params = {}
+    for token in proj_parameter.split():
+        key, _, value = token.lstrip("+").partition("=")
+        params[key] = value
+    return params
+
+
+class NetProjection:
+    """
+    SUMO network XY -> WGS84 lon/lat, done locally and in bulk.
+    Uses the network's <location netOffset projParameter>; pyproj when
+    installed, otherwise NumPy implementations of the projections SUMO's
+    OSM import produces (merc, utm). Anything else falls back to
+    traci.simulation.convertGeo per point.
+    """
+
+    def __init__(self, net_offset, proj_parameter, conv_boundary=None, orig_boundary=None):
+        self.net_offset = np.asarray(net_offset, dtype=np.float64)
+        self.proj_parameter = proj_parameter
+        self.conv_boundary = conv_boundary  # [x_min, y_min, x_max, y_max] network XY
+        self.orig_boundary = orig_boundary  # same in the original (geo) coordinates
+        self._inverse = self._make_inverse(proj_parameter)
+
+    @classmethod
+    def from_sumocfg(cls, sumocfg):
+        location = read_net_location(net_file_from_sumocfg(sumocfg))
+        offset = [float(v) for v in location.get("netOffset", "0,0").split(",")]
+        boundaries = [
+            [float(v) for v in location[key].split(",")] if key in location else None
+            for key in ("convBoundary", "origBoundary")
+        ]
+        projection = cls(offset, location.get("projParameter", "!"), *boundaries)
+        mode = "local" if projection.is_local() else "TraCI fallback"
+        print(f"🌍 Projection: {projection.proj_parameter.split()[0]} ({mode})")
+        return projection
+
+    def is_local(self):
+        return self._inverse is not None
+
+    # ---------------- PUBLIC API ----------------
+    def to_geo(self, xy):
+        """(N, 2) array of SUMO x/y -> (N, 2) array of [lon, lat]"""
+        xy = np.asarray(xy, dtype=np.float64).reshape(-1, 2)
+        if len(xy) == 0:
+            return np.empty((0, 2))
+
+        if self._inverse is None:
+            import traci
+
+            return np.array(
+                [traci.simulation.convertGeo(x, y, fromGeo=False) for x, y in xy]
+            )
+
+        px = xy[:, 0] - self.net_offset[0]
+        py = xy[:, 1] - self.net_offset[1]
+        lon, lat = self._inverse(px, py)
+        return np.column_stack((lon, lat))
+
+    def to_geo_point(self, x, y):
+        lon, lat = self.to_geo([[x, y]])[0]
+        return float(lon), float(lat)
+
+    def geo_bounds(self):
+        """(south, west, north, east) of the network, or None if unknown"""
+        if self.conv_boundary is not None and self.is_local():
+            x_min, y_min, x_max, y_max = self.conv_boundary
+            corners = self.to_geo([[x_min, y_min], [x_min, y_max], [x_max, y_min], [x_max, y_max]])
+            (west, south), (east, north) = corners.min(axis=0), corners.max(axis=0)
+            return float(south), float(west), float(north), float(east)
+        if self.orig_boundary is not None and self.proj_parameter != "!":
+            west, south, east, north = self.orig_boundary  # OSM imports: lon/lat
+            return south, west, north, east
+        return None
+
+    def shape_to_geo(self, shape, latlon=False):
+        """One lane/edge shape -> [[lon, lat], ...] (or [[lat, lon], ...] for Leaflet)"""
+        coords = self.to_geo(shape)
+        if latlon:
+            coords = coords[:, ::-1]
+        return coords.tolist()
+
+    def shapes_to_geo(self, shapes, latlon=False):
+        """Many shapes converted in one array operation"""
+        if not shapes:
+            return []
+        lengths = [len(s) for s in shapes]
+        coords = self.to_geo([p for s in shapes for p in s])
+        if latlon:
+            coords = coords[:, ::-1]
+        return [c.tolist() for c in np.split(coords, np.cumsum(lengths)[:-1])]
+
+    # ---------------- INVERSE PROJECTIONS ----------------
+    def _make_inverse(self, proj_parameter):
+        if not proj_parameter or proj_parameter == "!":
+            # Network is not geo-referenced: coordinates are used as-is
+            return lambda x, y: (x, y)
+
+        if Transformer is not None:
+            try:
+                transformer = Transformer.from_crs(
+                    CRS.from_proj4(proj_parameter), "EPSG:4326", always_xy=True
+                )
+                return transformer.transform
+            except Exception:
+                pass
+
+        params = _proj_params(proj_parameter)
+        a, f = ELLIPSOIDS.get(params.get("ellps", "WGS84"), ELLIPSOIDS["WGS84"])
+        if "a" in params:
+            a = float(params["a"])
+            b = float(params.get("b", a))
+            f = (a - b) / a
+
+        if params.get("proj") == "merc":
+            return self._mercator_inverse(params, a, f)
+        if params.get("proj") == "utm" and "zone" in params:
+            return self._utm_inverse(params, a, f)
+        return None
+
+    @staticmethod
+    def _mercator_inverse(params, a, f):
+        e = math.sqrt(f * (2 - f))
+        lon_0 = math.radians(float(params.get("lon_0", 0.0)))
+        x_0 = float(params.get("x_0", 0.0))
+        y_0 = float(params.get("y_0", 0.0))
+        lat_ts = math.radians(float(params.get("lat_ts", 0.0)))
+        k = float(params.get("k", params.get("k_0", 1.0)))
+        if lat_ts:
+            k = math.cos(lat_ts) / math.sqrt(1 - (e * math.sin(lat_ts)) ** 2)
+
+        def inverse(x, y):
+            lon = lon_0 + (x - x_0) / (a * k)
+            t = np.exp(-(y - y_0) / (a * k))
+            lat = np.pi / 2 - 2 * np.arctan(t)
+            for _ in range(6 if e else 0):
+                es = e * np.sin(lat)
+                lat = np.pi / 2 - 2 * np.arctan(t * ((1 - es) / (1 + es)) ** (e / 2))
+            return np.degrees(lon), np.degrees(lat)
+
+        return inverse
+
+    @staticmethod
+    def _utm_inverse(params, a, f):
+        # Snyder, "Map Projections: A Working Manual", inverse transverse Mercator
+        k0 = 0.9996
+        e2 = f * (2 - f)
+        ep2 = e2 / (1 - e2)
+        e1 = (1 - math.sqrt(1 - e2)) / (1 + math.sqrt(1 - e2))
+        lon_0 = math.radians((int(params["zone"]) - 1) * 6 - 180 + 3)
+        false_northing = 10000000.0 if "south" in params else 0.0
+
+        def inverse(x, y):
+            x = x - 500000.0
+            m = (y - false_northing) / k0
+            mu = m / (a * (1 - e2 / 4 - 3 * e2**2 / 64 - 5 * e2**3 / 256))
+            phi1 = (
+                mu
+                + (3 * e1 / 2 - 27 * e1**3 / 32) * np.sin(2 * mu)
+                + (21 * e1**2 / 16 - 55 * e1**4 / 32) * np.sin(4 * mu)
+                + (151 * e1**3 / 96) * np.sin(6 * mu)
+                + (1097 * e1**4 / 512) * np.sin(8 * mu)
+            )
+            sin1, cos1, tan1 = np.sin(phi1), np.cos(phi1), np.tan(phi1)
+            c1 = ep2 * cos1**2
+            t1 = tan1**2
+            n1 = a / np.sqrt(1 - e2 * sin1**2)
+            r1 = a * (1 - e2) / (1 - e2 * sin1**2) ** 1.5
+            d = x / (n1 * k0)
+
+            lat = phi1 - (n1 * tan1 / r1) * (
+                d**2 / 2
+                - (5 + 3 * t1 + 10 * c1 - 4 * c1**2 - 9 * ep2) * d**4 / 24
+                + (61 + 90 * t1 + 298 * c1 + 45 * t1**2 - 252 * ep2 - 3 * c1**2)
+                * d**6
+                / 720
+            )
+            lon = lon_0 + (
+                d
+                - (1 + 2 * t1 + c1) * d**3 / 6
+                + (5 - 2 * c1 + 28 * t1 - 3 * c1**2 + 8 * ep2 + 24 * t1**2)
+                * d**5
+                / 120
+            ) / cos1
+            return np.degrees(lon), np.degrees(lat)
+
+        return inverse
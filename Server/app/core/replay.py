@@ -0,0 +1,114 @@
+"""
+Replay of a recorded run (config `mode: "replay"`): no SUMO process.
+
+ReplaySUMOManager / ReplayEventManager give routes and socket handlers the
+SUMOManager / EventManager interface over a FrameArchive. Playback state
+(position, playing, speed) lives here; ReplayMode turns it into frames. A
+replay is read-only: `simulation_running` stays False, so closures and
+event creation are refused the way they are for a stopped simulation.
+"""
+
+from .frame_archive import FrameArchive
+from .street_geometry import StreetGeometry
+
+
+class ReplaySUMOManager:
+    def __init__(self, archive, config):
+        self.archive = archive
+        self.config = config
+        self.mode = archive.index.get("mode", "vegha")
+        self.loop_started = False
+        self.closed_streets = set()
+        self.available_streets = archive.index.get("streets", [])
+        self.street_names = archive.index.get("street_names", {})
+
+        body = archive.street_geometry_body()
+        self.street_geometry = (
+            StreetGeometry(body, archive.index.get("street_total", 0)) if body else None
+        )
+
+        self.simulation_paused = True
+        self.position = float(archive.start)  # simulation second being shown
+        self.seeked = True  # a frame is due even while paused
+
+    @classmethod
+    def from_config(cls, config):
+        replay = config.get("replay", {})
+        path = replay.get("path")
+        archive = FrameArchive(path) if path else FrameArchive.latest(
+            config.get("recording", {}).get("path", "recordings")
+        )
+        print(f"⏯️ Replaying {archive.path} ({archive.start}s - {archive.end}s)")
+        return cls(archive, config)
+
+    @property
+    def simulation_running(self):
+        return False  # Read-only: nothing can be closed or scheduled
+
+    def load_available_streets(self):
+        pass  # From the recording
+
+    def start_simulation(self):
+        if self.position >= self.archive.end:
+            self.seek(self.archive.start)
+        self.simulation_paused = False
+
+    def reset_simulation(self):
+        self.simulation_paused = True
+        self.seek(self.archive.start)
+
+    def shutdown_simulation(self):
+        self.reset_simulation()
+
+    def set_speed(self, step_delay):
+        self.config["simulation_speed"] = step_delay
+
+    def seek(self, t):
+        self.position = float(min(max(t, self.archive.start), self.archive.end))
+        self.seeked = True
+
+    def street_coords(self, street):
+        return []
+
+    def metrics_history(self, t_from=None, t_to=None, resolution=1, junctions=None):
+        return None
+
+    def heatmap_grid(self):
+        return None
+
+    def replay_info(self):
+        return {
+            **self.archive.info(),
+            "time": int(self.position),
+            "paused": self.simulation_paused,
+            "speed": self.config.get("simulation_speed", 0.1),
+        }
+
+
+class ReplayEventManager:
+    """Events as recorded in the frame being shown"""
+
+    def __init__(self):
+        self.events = []
+
+    def get_events(self):
+        return self.events
+
+    def id_exists(self, event_id):
+        return any(e.get("id") == event_id for e in self.events)
+
+    def title_exists(self, title):
+        return any(e.get("title") == title for e in self.events)
+
+    def update_event_statuses(self, current_time):
+        pass
+
+    def clear_events(self):
+        pass  # Recorded events are part of the replay
+
+    def _read_only(self, *args, **kwargs):
+        raise RuntimeError("Replays are read-only")
+
+    create_event = remove_event = _read_only
+    force_close_street = force_open_street = _read_only
+    handle_manual_close = handle_manual_open = _read_only
@@ -0,0 +1,182 @@
+"""
+Independent simulation sessions (opt-in: `sessions.enabled` in config.yaml).
+
+The simulation main.py builds is the "default" session. Every other session
+is a worker process (see sim_worker) with its own SUMO instance, TraCI
+connection (labelled with the session name), SUMOManager, EventManager and
+mode, plus a RemoteMode broadcasting into that session's rooms. A client
+belongs to exactly one session at a time and receives only its frames and
+street/event updates (room `session:<id>`).
+
+Sessions left without clients for `idle_timeout` seconds are evicted; up to
+`warm_spares` evicted workers are reset to time 0 and kept for the next
+session instead of starting SUMO again.
+"""
+
+import itertools
+import time
+
+import eventlet
+
+from .sim_worker import RemoteEventManager, RemoteSUMOManager, SimulationClient
+
+DEFAULT_SESSION = "default"
+
+
+def session_room(session_id):
+    return f"session:{session_id}"
+
+
+def session_from_request(sessions, request):
+    """Session named by an HTTP request (`?session=` or `X-Session` header)"""
+    return sessions.get(request.args.get("session") or request.headers.get("X-Session"))
+
+
+class Session:
+    def __init__(self, session_id, sumo_manager, event_manager, mode, client=None):
+        self.id = session_id
+        self.sumo = sumo_manager
+        self.events = event_manager
+        self.mode = mode
+        self.client = client  # None for the default session
+        self.members = set()
+        self.last_active = time.monotonic()
+
+    def room(self):
+        return session_room(self.id)
+
+    def info(self):
+        return {
+            "session": self.id,
+            "clients": len(self.members),
+            "mode": self.sumo.mode,
+            "running": self.sumo.simulation_running,
+        }
+
+
+class SessionPool:
+    def __init__(self, socketio, config, default_session, mode_class):
+        sessions_config = config.get("sessions", {})
+        self.max_sessions = sessions_config.get("max_sessions", 4)
+        self.idle_timeout = sessions_config.get("idle_timeout", 600)
+        self.warm_spares = sessions_config.get("warm_spares", 1)
+
+        self.socketio = socketio
+        self.config = config
+        self.mode_class = mode_class  # RemoteMode: broadcasts a worker's snapshots
+
+        self.sessions = {DEFAULT_SESSION: default_session}
+        self.by_sid = {}  # sid -> session id
+        self.warm = []  # SimulationClients reset to time 0, ready for reuse
+        self._starting = 0  # Slots reserved by create() calls still starting a worker
+        self._labels = itertools.count(1)
+        self._ids = itertools.count(1)
+
+        eventlet.spawn(self._evict_loop)
+
+    # ---------------- LOOKUP ----------------
+    def get(self, session_id):
+        return self.sessions.get(session_id or DEFAULT_SESSION)
+
+    def session_of(self, sid):
+        return self.sessions[self.by_sid.get(sid, DEFAULT_SESSION)]
+
+    def list(self):
+        return [s.info() for s in self.sessions.values()]
+
+    # ---------------- LIFECYCLE ----------------
+    def create(self):
+        """New session on a warm worker if one is spare; None when the pool is full"""
+        if len(self.sessions) - 1 + self._starting >= self.max_sessions:
+            return None
+
+        if self.warm:
+            client = self.warm.pop()
+        else:
+            # Starting a worker yields to other greenlets: hold the slot meanwhile
+            self._starting += 1
+            try:
+                client = SimulationClient(self.config, label=f"session-{next(self._labels)}")
+            finally:
+                self._starting -= 1
+
+        session_id = f"s{next(self._ids)}"
+        sumo_manager = RemoteSUMOManager(client, dict(self.config))
+        event_manager = RemoteEventManager(client)
+        mode = self.mode_class(
+            sumo_manager,
+            event_manager,
+            self.socketio,
+            client.snapshots,
+            room_prefix=f"{session_room(session_id)}:",
+        )
+        session = self.sessions[session_id] = Session(
+            session_id, sumo_manager, event_manager, mode, client
+        )
+        print(f"🧩 Session {session_id} created ({len(self.sessions) - 1}/{self.max_sessions})")
+        return session
+
+    def close(self, session):
+        if session.id == DEFAULT_SESSION:
+            return
+        for sid in list(session.members):
+            self.join(sid, DEFAULT_SESSION)
+        del self.sessions[session.id]
+        session.mode.broadcasting = False
+
+        client = session.client
+        if len(self.warm) < self.warm_spares and client.alive():
+            # Back to a clean time-0 state, paused, for the next session
+            client.call("set_paused", True)
+            client.call("clear_events")
+            client.call("set_mode", "vegha")
+            client.call("reset")
+            client.call("set_paused", True)
+            self.warm.append(client)
+            print(f"♻️ Session {session.id} closed; worker kept warm")
+        else:
+            client.stop()
+            print(f"🗑️ Session {session.id} closed")
+
+    def _evict_loop(self):
+        while True:
+            eventlet.sleep(min(30, self.idle_timeout))
+            now = time.monotonic()
+            for session in list(self.sessions.values()):
+                if (
+                    session.id != DEFAULT_SESSION
+                    and not session.members
+                    and now - session.last_active > self.idle_timeout
+                ):
+                    try:
+                        self.close(session)
+                    except Exception as e:
+                        print(f"⚠️ Error evicting session {session.id}: {e}")
+
+    # ---------------- CLIENTS ----------------
+    def join(self, sid, session_id):
+        session = self.get(session_id)
+        if session is None:
+            return None
+
+        current = self.by_sid.get(sid)
+        if current == session.id:
+            return session
+        if current is not None:
+            self.leave(sid)
+
+        self.by_sid[sid] = session.id
+        session.members.add(sid)
+        session.last_active = time.monotonic()
+        session.mode.frames.add_client(sid)
+        self.socketio.server.enter_room(sid, session.room(), namespace="/")
+        return session
+
+    def leave(self, sid):
+        session = self.sessions.get(self.by_sid.pop(sid, None))
+        if session is None:
+            return
+        session.members.discard(sid)
+        session.last_active = time.monotonic()
+        session.mode.frames.remove_client(sid)
+        self.socketio.server.leave_room(sid, session.room(), namespace="/")
@@ -0,0 +1,425 @@
+"""
+SUMO in a dedicated worker process (opt-in: `worker.enabled` in config.yaml).
+
+The worker owns the TraCI connection and the mode's step loop; the web
+server never calls TraCI. They talk through:
+
+    commands:  (request_id, name, args) tuples over a duplex Pipe; the worker
+               drains everything queued and applies it as one batch between
+               steps, then replies to each with the result and fresh state
+    snapshots: a SharedSnapshotBuffer; the web tier's broadcaster reads it
+               exactly like the in-process SnapshotBuffer
+    state:     closed streets, events and run flags mirrored to the web tier
+               (pushed whenever they change), street list after each reset,
+               and the street geometry artifact once
+
+RemoteSUMOManager / RemoteEventManager give routes and socket handlers the
+same interface as the local managers.
+
+The worker is a fresh interpreter (`python -m core.sim_worker <fd>`), not a
+fork of the web server: forking would copy eventlet's hub, greenlets and
+open sockets into it. It imports only app.simulation and core, receives its
+config over the command socket, and attaches to the snapshot block by name.
+"""
+
+import itertools
+import os
+import signal
+import socket
+import subprocess
+import sys
+import threading
+import time
+from multiprocessing.connection import Connection
+
+import eventlet
+import traci
+from eventlet.event import Event
+from eventlet.hubs import trampoline
+
+from .loop_metrics import METRICS
+from .snapshot_buffer import SharedSnapshotBuffer
+from .street_geometry import StreetGeometry
+
+
+def start_module_process(module):
+    """
+    `python -m <module> <fd>` in a fresh interpreter, connected by a socket
+    pair: returns (Connection, Popen). The child gets this process's import
+    path, so it finds core, app and FDRL, but none of its state.
+    """
+    ours, theirs = socket.socketpair()
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(p for p in sys.path if p))
+    try:
+        process = subprocess.Popen(
+            [sys.executable, "-m", module, str(theirs.fileno())],
+            pass_fds=(theirs.fileno(),),
+            env=env,
+        )
+    except OSError:
+        ours.close()
+        raise
+    finally:
+        theirs.close()
+    return Connection(ours.detach()), process
+
+
+class SimulationWorker:
+    """Worker-process side: applies command batches and steps the simulation"""
+
+    def __init__(self, conn, sumo_manager, event_manager, mode):
+        self.conn = conn
+        self.sumo = sumo_manager
+        self.events = event_manager
+        self.mode = mode
+        self._sent_state = None
+
+        sumo, events = sumo_manager, event_manager
+        self.commands = {
+            "start": sumo.start_simulation,
+            "set_paused": lambda paused: setattr(sumo, "simulation_paused", paused),
+            "reset": self.reset,
+            "shutdown": sumo.shutdown_simulation,
+            "speed": sumo.set_speed,
+            "set_mode": lambda mode: setattr(sumo, "mode", mode),
+            "street_coords": sumo.street_coords,
+            "metrics_history": sumo.metrics_history,
+            "heatmap": sumo.heatmap_grid,
+            "fork_state": sumo.fork_state,
+            "metrics": METRICS.collect,
+            "advance": self.advance,
+            "create_event": events.create_event,
+            "remove_event": events.remove_event,
+            "clear_events": events.clear_events,
+            "force_close_street": events.force_close_street,
+            "force_open_street": events.force_open_street,
+            "manual_close": events.handle_manual_close,
+            "manual_open": events.handle_manual_open,
+        }
+
+    def reset(self):
+        self.sumo.reset_simulation()
+        self.mode.step = 0
+
+    def advance(self):
+        """Exactly one step on request (lockstep driving); always publishes a snapshot"""
+        self.mode.advance(step_delay=1)
+        return self.mode.step
+
+    def state(self):
+        return {
+            "running": self.sumo.simulation_running,
+            "paused": self.sumo.simulation_paused,
+            "mode": self.sumo.mode,
+            "step": self.mode.step,
+            "closed_streets": sorted(self.sumo.closed_streets),
+            "events": [e.copy() for e in self.events.events],
+        }
+
+    def send_streets(self):
+        self.conn.send(("streets", self.sumo.available_streets, self.sumo.street_names))
+
+    def run(self):
+        geometry = self.sumo.street_geometry
+        self.conn.send(("geometry", geometry.body, geometry.total))
+        self.send_streets()
+        self.push_state()
+
+        try:
+            self._loop()
+        finally:
+            self.sumo.close_recording()
+
+    def _loop(self):
+        max_steps = self.sumo.config.get("max_steps", 7200)
+        while True:
+            step_delay = self.sumo.config.get("simulation_speed", 0.1)
+            stepping = (
+                self.sumo.simulation_running
+                and not self.sumo.simulation_paused
+                and self.mode.step < max_steps
+            )
+            started = time.monotonic()
+
+            if stepping:
+                try:
+                    self.mode.advance(step_delay)
+                except traci.FatalTraCIError:
+                    print("⚠️ TraCI connection lost. Stopping loop.")
+                    self.sumo.simulation_running = False
+                except Exception as e:
+                    print(f"❌ Simulation error: {e}")
+                    self.sumo.simulation_running = False
+                self.push_state()
+
+            # Commands are applied between steps; waiting on the pipe is the step pacing
+            timeout = step_delay if stepping else 0.5
+            remaining = max(0.0, timeout - (time.monotonic() - started))
+            if self.conn.poll(remaining) and not self.apply_batch():
+                return
+
+    def apply_batch(self):
+        batch = []
+        while self.conn.poll():
+            try:
+                batch.append(self.conn.recv())
+            except EOFError:
+                return False  # Web server is gone
+
+        results = []
+        resets = False
+        for request_id, name, args in batch:
+            if name == "stop":
+                return False
+            try:
+                result = self.commands[name](*args)
+            except Exception as e:
+                print(f"⚠️ Worker command {name} failed: {e}")
+                result = None
+            resets = resets or name in ("reset", "set_mode")
+            results.append((request_id, result))
+
+        if resets:
+            self.send_streets()
+        state = self.state()
+        self._sent_state = state
+        for request_id, result in results:
+            self.conn.send(("reply", request_id, result, state))
+        return True
+
+    def push_state(self):
+        state = self.state()
+        # Step alone does not warrant a message
+        if self._sent_state is None or {**state, "step": 0} != {**self._sent_state, "step": 0}:
+            self._sent_state = state
+            self.conn.send(("state", state))
+
+
+class SimulationClient:
+    """Web-server side: starts the worker, relays commands, mirrors its state"""
+
+    def __init__(self, config, label="default", sumo_mode="vegha"):
+        worker_config = config.get("worker", {})
+        self.call_timeout = worker_config.get("call_timeout", 10)
+        self.metrics_timeout = worker_config.get("metrics_timeout", 1)
+        self.snapshots = SharedSnapshotBuffer(worker_config.get("snapshot_bytes", 32 * 1024 * 1024))
+
+        self.state = {"running": False, "paused": False, "mode": "vegha", "step": 0,
+                      "closed_streets": [], "events": []}
+        self.available_streets = []
+        self.street_names = {}
+        self.street_geometry = None
+
+        self._pending = {}
+        self._ids = itertools.count(1)
+        self._send_lock = threading.Lock()
+
+        self.conn, self.process = start_module_process("core.sim_worker")
+        self.conn.send((config, label, sumo_mode, self.snapshots.name, self.snapshots.slot_bytes))
+
+        # Block until the network is loaded, like SUMOManager() does in-process
+        while self.street_geometry is None:
+            if not self.alive():
+                self.conn.close()
+                self.snapshots.close()
+                raise RuntimeError("❌ Simulation worker exited during startup")
+            try:
+                self._receive(timeout=0.5)
+            except EOFError:
+                pass  # Exited: reported on the next check
+
+        eventlet.spawn(self._listen)
+        print(f"🧵 Simulation worker running (pid {self.process.pid})")
+
+    def alive(self):
+        return self.process.poll() is None
+
+    # ---------------- COMMANDS ----------------
+    def call(self, name, *args, timeout=None):
+        """Send a command and wait (green) until the worker has applied it (None on timeout)"""
+        request_id = next(self._ids)
+        done = Event()
+        self._pending[request_id] = done
+        with self._send_lock:
+            self.conn.send((request_id, name, args))
+
+        result = None
+        with eventlet.Timeout(self.call_timeout if timeout is None else timeout, False):
+            result = done.wait()
+        self._pending.pop(request_id, None)
+        return result
+
+    def stop(self):
+        try:
+            with self._send_lock:
+                self.conn.send((0, "stop", ()))
+            self.process.wait(timeout=5)
+        except (OSError, subprocess.TimeoutExpired):
+            self.process.terminate()  # Still lets the worker close its recording
+            try:
+                self.process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+        self.conn.close()
+        self.snapshots.close()
+
+    # ---------------- MESSAGES ----------------
+    def _listen(self):
+        while True:
+            try:
+                # Parks this greenlet in the hub until the worker writes (or exits)
+                trampoline(self.conn.fileno(), read=True)
+                self._receive(timeout=0)
+            except (EOFError, OSError):
+                print("⚠️ Simulation worker exited")
+                self.state["running"] = False
+                return
+
+    def _receive(self, timeout):
+        while self.conn.poll(timeout):
+            timeout = 0
+            kind, *payload = self.conn.recv()
+            if kind == "reply":
+                request_id, result, state = payload
+                self.state = state
+                done = self._pending.get(request_id)
+                if done is not None:
+                    done.send(result)
+            elif kind == "state":
+                self.state = payload[0]
+            elif kind == "streets":
+                self.available_streets, self.street_names = payload
+            elif kind == "geometry":
+                self.street_geometry = StreetGeometry(*payload)
+
+
+class RemoteSUMOManager:
+    """SUMOManager interface backed by the worker"""
+
+    def __init__(self, client, config):
+        self.client = client
+        self.config = config
+        self.loop_started = False
+
+    @property
+    def simulation_running(self):
+        return self.client.state["running"]
+
+    @property
+    def simulation_paused(self):
+        return self.client.state["paused"]
+
+    @simulation_paused.setter
+    def simulation_paused(self, paused):
+        self.client.call("set_paused", paused)
+
+    @property
+    def mode(self):
+        return self.client.state["mode"]
+
+    @mode.setter
+    def mode(self, mode):
+        self.client.call("set_mode", mode)
+
+    @property
+    def closed_streets(self):
+        return set(self.client.state["closed_streets"])
+
+    @property
+    def available_streets(self):
+        return self.client.available_streets
+
+    @property
+    def street_names(self):
+        return self.client.street_names
+
+    @property
+    def street_geometry(self):
+        return self.client.street_geometry
+
+    def load_available_streets(self):
+        pass  # Mirrored from the worker after every reset
+
+    def start_simulation(self):
+        self.client.call("start")
+
+    def reset_simulation(self):
+        self.client.call("reset")
+
+    def shutdown_simulation(self):
+        self.client.call("shutdown")
+
+    def set_speed(self, step_delay):
+        self.config["simulation_speed"] = step_delay
+        self.client.call("speed", step_delay)
+
+    def street_coords(self, street):
+        return self.client.call("street_coords", street) or []
+
+    def metrics_history(self, t_from=None, t_to=None, resolution=1, junctions=None):
+        return self.client.call("metrics_history", t_from, t_to, resolution, junctions)
+
+    def heatmap_grid(self):
+        return self.client.call("heatmap")
+
+    def fork_state(self):
+        return self.client.call("fork_state")
+
+
+class RemoteEventManager:
+    """EventManager interface backed by the worker"""
+
+    def __init__(self, client):
+        self.client = client
+
+    @property
+    def events(self):
+        return self.client.state["events"]
+
+    def get_events(self):
+        return self.events
+
+    def id_exists(self, event_id):
+        return any(str(e.get("id")) == str(event_id) for e in self.events)
+
+    def title_exists(self, title):
+        return any(e.get("title") == title for e in self.events)
+
+    def create_event(self, event_id, title, streets, start_time=None, end_time=None):
+        return self.client.call("create_event", event_id, title, streets, start_time, end_time)
+
+    def remove_event(self, event_id):
+        return bool(self.client.call("remove_event", event_id))
+
+    def clear_events(self):
+        self.client.call("clear_events")
+
+    def force_close_street(self, street):
+        self.client.call("force_close_street", street)
+
+    def force_open_street(self, street):
+        self.client.call("force_open_street", street)
+
+    def handle_manual_close(self, street):
+        self.client.call("manual_close", street)
+
+    def handle_manual_open(self, street):
+        self.client.call("manual_open", street)
+
+
+def worker_main(fd):
+    """Worker process entry point: build the simulation and serve the web tier"""
+    conn = Connection(fd)
+    config, label, sumo_mode, snapshot_name, slot_bytes = conn.recv()
+    # SIGTERM unwinds like a stop, so the run's cleanup (recording tail) happens
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+
+    from app.simulation import build_simulation
+
+    sumo_manager, event_manager, mode = build_simulation(config, label=label, sumo_mode=sumo_mode)
+    mode.snapshots = SharedSnapshotBuffer(slot_bytes, name=snapshot_name)
+    SimulationWorker(conn, sumo_manager, event_manager, mode).run()
+
+
+if __name__ == "__main__":
+    worker_main(int(sys.argv[1]))
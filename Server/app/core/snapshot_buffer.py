@@ -0,0 +1,128 @@
+import pickle
+import struct
+import time
+from multiprocessing import resource_tracker, shared_memory
+
+
+class SnapshotBuffer:
+    """
+    Double buffer between the simulation loop (writer) and the broadcaster
+    (reader). The writer fills the back slot and swaps; the reader only ever
+    sees complete snapshots and skips versions it was too slow for, so
+    intermediate steps are coalesced instead of queued.
+    """
+
+    def __init__(self):
+        self._slots = [None, None]
+        self._front = 0
+        self.version = 0
+        self._read_version = 0
+
+    def publish(self, snapshot):
+        back = 1 - self._front
+        self._slots[back] = snapshot
+        self._front = back
+        self.version += 1
+
+    def latest(self):
+        """(version, snapshot) of the newest complete snapshot"""
+        return self.version, self._slots[self._front]
+
+    def take(self):
+        """Newest snapshot if the reader has not seen it yet, else None"""
+        if self.version == self._read_version:
+            return None
+        self._read_version = self.version
+        return self._slots[self._front]
+
+    def consumed(self):
+        """True when the reader has taken the newest snapshot (or there is none)"""
+        return self.version == self._read_version
+
+
+
+class SharedSnapshotBuffer:
+    """
+    SnapshotBuffer across processes: the same two slots in one shared-memory
+    block, snapshots pickled into the back slot. The web server creates the
+    block (and owns it); the worker attaches to it by name.
+
+    The header is guarded by a seqlock: the sequence number is odd while the
+    writer is publishing and even once it is done. The reader copies the
+    front slot and retries while the sequence is odd or changed during the
+    copy. Published versions are sequence // 2.
+    """
+
+    # sequence, front slot, slot 0 length, slot 1 length (writer) | read sequence (reader)
+    HEADER = struct.Struct("<4QQ")
+
+    def __init__(self, slot_bytes=32 * 1024 * 1024, name=None):
+        self.slot_bytes = slot_bytes
+        if name is None:
+            self.shm = shared_memory.SharedMemory(create=True, size=self.HEADER.size + 2 * slot_bytes)
+            self.HEADER.pack_into(self.shm.buf, 0, 0, 0, 0, 0, 0)
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+            # Attached, not owned: the worker's resource tracker must not unlink it
+            resource_tracker.unregister(self.shm._name, "shared_memory")
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    def _slot(self, index):
+        start = self.HEADER.size + index * self.slot_bytes
+        return start, start + self.slot_bytes
+
+    def _sequence(self):
+        return struct.unpack_from("<Q", self.shm.buf, 0)[0]
+
+    def publish(self, snapshot):
+        data = pickle.dumps(snapshot, protocol=pickle.HIGHEST_PROTOCOL)
+        if len(data) > self.slot_bytes:
+            print(f"⚠️ Snapshot of {len(data)} bytes exceeds worker.snapshot_bytes; dropped")
+            return
+
+        sequence, front, len0, len1, _ = self.HEADER.unpack_from(self.shm.buf, 0)
+        struct.pack_into("<Q", self.shm.buf, 0, sequence + 1)  # Odd: writing
+
+        back = 1 - front
+        start, _ = self._slot(back)
+        self.shm.buf[start:start + len(data)] = data
+        lengths = [len0, len1]
+        lengths[back] = len(data)
+        struct.pack_into("<3Q", self.shm.buf, 8, back, *lengths)
+
+        struct.pack_into("<Q", self.shm.buf, 0, sequence + 2)  # Even: done
+
+    def _read_front(self):
+        """(sequence, snapshot) of a consistent front slot"""
+        while True:
+            sequence, front, len0, len1, _ = self.HEADER.unpack_from(self.shm.buf, 0)
+            if sequence % 2:
+                time.sleep(0)  # Writer mid-publish
+                continue
+            start, _ = self._slot(front)
+            data = bytes(self.shm.buf[start:start + (len0, len1)[front]])
+            if self._sequence() == sequence:
+                return sequence, (pickle.loads(data) if data else None)
+
+    def latest(self):
+        sequence, snapshot = self._read_front()
+        return sequence // 2, snapshot
+
+    def take(self):
+        if self.consumed():
+            return None
+        sequence, snapshot = self._read_front()
+        struct.pack_into("<Q", self.shm.buf, 32, sequence)
+        return snapshot
+
+    def consumed(self):
+        sequence, _, _, _, read_sequence = self.HEADER.unpack_from(self.shm.buf, 0)
+        return sequence == read_sequence
+
+    def close(self):
+        """Owner side (web server) only: release and remove the block"""
+        self.shm.close()
+        self.shm.unlink()
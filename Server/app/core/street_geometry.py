@@ -0,0 +1,74 @@
+import gzip
+import hashlib
+import json
+import traci
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+class StreetGeometry:
+    """
+    Street geometry of the loaded network as one GeoJSON artifact.
+    Built once per network; served over HTTP pre-compressed with an ETag so
+    sockets only need to announce its version.
+    """
+
+    def __init__(self, body, total):
+        self.body = body
+        self.total = total
+        self.version = hashlib.sha1(body).hexdigest()[:16]
+        self.encodings = {"gzip": gzip.compress(body, compresslevel=9)}
+        if brotli is not None:
+            self.encodings["br"] = brotli.compress(body)
+
+    @classmethod
+    def build(cls, projection):
+        names, shapes = [], []
+        for edge_id in traci.edge.getIDList():
+            # Skip internal junctions
+            if edge_id.startswith(":"):
+                continue
+            try:
+                shape = traci.lane.getShape(edge_id + "_0")
+            except traci.TraCIException:
+                continue
+            if shape and len(shape) >= 2:  # Only streets with valid paths
+                names.append(edge_id)
+                shapes.append(shape)
+
+        features = [
+            {
+                "type": "Feature",
+                "properties": {"id": edge_id},
+                "geometry": {
+                    "type": "LineString",
+                    "coordinates": [[round(lon, 6), round(lat, 6)] for lon, lat in coords],
+                },
+            }
+            for edge_id, coords in zip(names, projection.shapes_to_geo(shapes))
+        ]
+        body = json.dumps(
+            {"type": "FeatureCollection", "features": features}, separators=(",", ":")
+        ).encode()
+
+        geometry = cls(body, len(features))
+        print(f"🗺️ Street geometry: {geometry.total} streets, {len(body) // 1024} KiB (v {geometry.version})")
+        return geometry
+
+    def url(self):
+        return f"/api/streets/geometry?v={self.version}"
+
+    def announcement(self):
+        """What a connecting socket receives instead of the coordinates"""
+        return {"version": self.version, "geometry_url": self.url(), "total": self.total}
+
+    def encoded(self, accept_encoding):
+        """(body, content-encoding or None) for an Accept-Encoding header"""
+        accepted = {e.split(";")[0].strip() for e in accept_encoding.split(",")}
+        for encoding in ("br", "gzip"):
+            if encoding in accepted and encoding in self.encodings:
+                return self.encodings[encoding], encoding
+        return self.body, None
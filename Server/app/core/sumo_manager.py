@@ -2,28 +2,70 @@ from statistics import mode
 import traci
 import os
 import sys
+import atexit
+import tempfile
 import eventlet
 
+import numpy as np
+
+from .closure_enforcer import ClosureEnforcer
+from .emergency_registry import EmergencyVehicleRegistry
+from .frame_archive import FrameRecorder
+from .heatmap import DensityHeatmap
+from .junction_lanes import JunctionLaneIndex
+from .kpi_history import KPIHistory
+from .loop_metrics import METRICS
+from .projection import NetProjection
+from .street_geometry import StreetGeometry
+from .tls_display import TrafficLightDisplayIndex
+from .vehicle_table import VehicleTable
+
+
+# Signal program id per controller mode
+SIGNAL_PROGRAMS = {"vegha": "0", "fixed": "fixed_60"}
+
 
 class SUMOManager:
-    def __init__(self, config, mode="vegha"):
+    def __init__(self, config, mode="vegha", label="default"):
         self.config = config
+        self.label = label  # TraCI connection label (one per session)
         self.simulation_running = False
         self.simulation_paused = False
         self.closed_streets = set()
+        self.closures = ClosureEnforcer(self)
+        self.emergency = EmergencyVehicleRegistry()
+        self.vehicle_table = VehicleTable()
+        self.street_geometry = None
         self.available_streets = []
         self.street_names = {}  # Cache for street names {id: name}
         self.bounds = config.get("bounds")
         self.step = 0
         self.mode = mode  # "vegha" or "fixed"
         self.loop_started = False
+        self.active_tls = set()
+        self.tls_index = TrafficLightDisplayIndex({})
+        self.junction_lanes = JunctionLaneIndex({})
+        self.kpi_history = None
+        self.recorder = FrameRecorder.from_config(self, config)  # None unless recording.enabled
+        if self.recorder is not None:
+            atexit.register(self.recorder.close)
+        self._state_file = None  # time-0 saveState for warm resets
+        atexit.register(self._remove_state_file)  # Once, whichever file is current at exit
+        self._street_permissions = {}  # lane -> allowed classes before a closure
 
         # 1. Prepare the SUMO Command (Path logic moved here)
         self.sumo_cmd = self._get_sumo_cmd()
 
+        # Local SUMO XY -> lon/lat conversion (no convertGeo round-trips)
+        self.projection = NetProjection.from_sumocfg(self.sumo_cmd[2])
+        self.heatmap = DensityHeatmap.from_config(config, self.projection)
+
+        METRICS.configure(config)
+        METRICS.instrument_traci()
+
         # 2. Start SUMO immediately
         print("🚀 Initializing SUMO...")
-        traci.start(self.sumo_cmd)
+        traci.start(self.sumo_cmd, label=self.label)
 
         # 3. Detect or Load Active TLS
         controlled_junctions = self.config.get("system", {}).get(
@@ -58,7 +100,7 @@ class SUMOManager:
         if not os.path.exists(sumo_config):
             raise FileNotFoundError(f"Not found: {sumo_config}")
 
-        return [
+        cmd = [
             "sumo",
             "-c",
             sumo_config,
@@ -67,6 +109,11 @@ class SUMOManager:
             "--step-length",
             "1",
         ]
+        # Fixed seed: identical demand across instances (e.g. comparison runs)
+        seed = self.config.get("simulation", {}).get("seed")
+        if seed is not None:
+            cmd += ["--seed", str(seed)]
+        return cmd
 
     def _detect_active_tls(self):
         """Runs 100 steps to find which signals actually change."""
@@ -107,11 +154,82 @@ class SUMOManager:
 
     def _reset_internal(self):
         """Resets SUMO to time 0 without killing the process"""
+        if self._state_file and self._warm_reset():
+            return
+
         # traci.load reloads the config using the arguments (excluding the binary name)
         traci.load(self.sumo_cmd[1:])
+        self.emergency.reset()
+        self._street_permissions.clear()
+        self.apply_signal_programs()
         self.load_available_streets()
+        # Static signal geometry; subscriptions do not survive traci.load
+        self.tls_index = TrafficLightDisplayIndex.build(self.active_tls, self.projection)
+        self.junction_lanes = JunctionLaneIndex.build(self.active_tls)
+        self.vehicle_table.subscribe_all()
+        # Same network on every reload: street geometry is built only once
+        if self.street_geometry is None:
+            self.street_geometry = StreetGeometry.build(self.projection)
+        if self.kpi_history is None:
+            self.kpi_history = KPIHistory(
+                self.config.get("metrics", {}).get("history_steps", 7200),
+                self.junction_lanes.junctions,
+            )
+        self.kpi_history.clear()
+        self.heatmap.clear()
         self.step = 0
 
+        # Snapshot of time 0: later resets restore it instead of reparsing everything
+        self._remove_state_file()  # A previous one, if any
+        try:
+            fd, self._state_file = tempfile.mkstemp(prefix="vegha-t0-", suffix=".xml")
+            os.close(fd)
+            traci.simulation.saveState(self._state_file)
+        except Exception as e:
+            print(f"⚠️ Could not save time-0 state, resets will reload: {e}")
+            self._remove_state_file()
+
+    def _warm_reset(self):
+        """Back to time 0 from the saved state; False falls back to traci.load"""
+        try:
+            # Lane permissions are network data, not part of the saved state
+            for lane_id, allowed in self._street_permissions.items():
+                traci.lane.setAllowed(lane_id, allowed)
+            self._street_permissions.clear()
+
+            traci.simulation.loadState(self._state_file)
+        except traci.TraCIException as e:
+            print(f"⚠️ Warm reset failed, reloading: {e}")
+            self._remove_state_file()
+            return False
+
+        self.emergency.reset()
+        self.apply_signal_programs()
+        # Same network and time 0: street catalogue, signal heads and geometry still hold
+        self.tls_index.subscribe()
+        self.junction_lanes.subscribe()
+        self.vehicle_table.subscribe_all()
+        self.kpi_history.clear()
+        self.heatmap.clear()
+        self.step = 0
+        print("⚡ Warm reset to time 0")
+        return True
+
+    def _remove_state_file(self):
+        if self._state_file and os.path.exists(self._state_file):
+            os.remove(self._state_file)
+        self._state_file = None
+
+    def remember_street_permissions(self, street):
+        """Record a street's lane permissions before closing it (restored on reset)"""
+        try:
+            for i in range(traci.edge.getLaneNumber(street)):
+                lane_id = f"{street}_{i}"
+                if lane_id not in self._street_permissions:
+                    self._street_permissions[lane_id] = traci.lane.getAllowed(lane_id)
+        except traci.TraCIException:
+            pass
+
     def start_simulation(self):
         """Called when user clicks Play. SUMO is already open, just unpause."""
         self.simulation_running = True
@@ -140,57 +258,66 @@ class SUMOManager:
 
         self.simulation_paused = False
 
-    def load_available_streets(self):
-        self.available_streets = []
-
-        # Optional: Set programs if needed
-        all_junctions = traci.trafficlight.getIDList()
-        for jid in all_junctions:
-            all_junctions = traci.trafficlight.getIDList()
-
-            if self.mode == "vegha":
-                for jid in all_junctions:
-                    try:
-                        traci.trafficlight.setProgram(jid, "0")
-
-                    except:
-                        pass
+    def apply_signal_programs(self):
+        """Signal program for the current mode on every traffic light"""
+        program = SIGNAL_PROGRAMS.get(self.mode)
+        if program is None:
+            return
+        for jid in traci.trafficlight.getIDList():
+            try:
+                traci.trafficlight.setProgram(jid, program)
+            except:
+                pass
 
-            elif self.mode == "fixed":
-                for jid in all_junctions:
-                    try:
-                        traci.trafficlight.setProgram(jid, "fixed_60")
-                    except:
-                        pass
+    def load_available_streets(self):
+        # Static per network: built once, reused by every reset
+        if self.available_streets:
+            return
 
         try:
-            for edge_id in traci.edge.getIDList():
-                if edge_id.startswith(":"):
+            edge_ids = [e for e in traci.edge.getIDList() if not e.startswith(":")]
+            if not self.bounds:
+                # No bounds configured: every edge is selectable
+                self.available_streets = edge_ids
+                print(f"✅ Loaded {len(self.available_streets)} streets (no bounds)")
+                return
+
+            shapes = []
+            for edge_id in edge_ids:
+                try:
+                    shapes.append(traci.lane.getShape(f"{edge_id}_0"))
+                except:
+                    shapes.append(None)
+
+            # Project every shape point at once, then test bounds per edge
+            lengths = [len(s) if s else 0 for s in shapes]
+            coords = self.projection.to_geo([p for s in shapes if s for p in s])
+            lon, lat = coords[:, 0], coords[:, 1]
+            inside = (
+                (self.bounds["min_lat"] <= lat)
+                & (lat <= self.bounds["max_lat"])
+                & (self.bounds["min_lon"] <= lon)
+                & (lon <= self.bounds["max_lon"])
+            )
+            edge_inside = np.zeros(len(edge_ids), dtype=bool)
+            edge_inside[np.repeat(np.arange(len(edge_ids)), lengths)[inside]] = True
+
+            for edge_id, shape, is_inside in zip(edge_ids, shapes, edge_inside):
+                if shape is None:
+                    self.available_streets.append(edge_id)
+                    continue
+                if not is_inside:
                     continue
 
+                # Get Human Readable Name (if available)
                 try:
-                    lane_id = f"{edge_id}_0"
-                    shape = traci.lane.getShape(lane_id)
-
-                    for x, y in shape:
-                        lon, lat = traci.simulation.convertGeo(x, y, fromGeo=False)
-
-                        if (
-                            self.bounds["min_lat"] <= lat <= self.bounds["max_lat"]
-                            and self.bounds["min_lon"] <= lon <= self.bounds["max_lon"]
-                        ):
-                            # Get Human Readable Name (if available)
-                            try:
-                                name = traci.edge.getStreetName(edge_id)
-                                if name and name.strip():  # Check if not empty
-                                    self.street_names[edge_id] = name
-                            except:
-                                pass
-
-                            self.available_streets.append(edge_id)
-                            break
+                    name = traci.edge.getStreetName(edge_id)
+                    if name and name.strip():  # Check if not empty
+                        self.street_names[edge_id] = name
                 except:
-                    self.available_streets.append(edge_id)
+                    pass
+
+                self.available_streets.append(edge_id)
 
             print(
                 f"✅ Loaded {len(self.available_streets)} streets ({len(self.street_names)} with names)"
@@ -199,14 +326,59 @@ class SUMOManager:
         except Exception as e:
             print(f"⚠️ Error loading streets: {e}")
 
+    def set_speed(self, step_delay):
+        """Seconds of wall time per simulation step (0 = turbo)"""
+        self.config["simulation_speed"] = step_delay
+
+    def shutdown_simulation(self):
+        """Stop the loop and close TraCI (the `reset` socket event)"""
+        self.simulation_running = False
+        self.simulation_paused = False
+        self.closed_streets.clear()
+        self.close_recording()
+        try:
+            traci.close()
+        except:
+            pass
+
+    def close_recording(self):
+        """Write the recording's buffered tail (atexit alone misses os._exit and signals)"""
+        if self.recorder is not None:
+            self.recorder.close()
+
+    def fork_state(self):
+        """Save the current state for what-if forks (see core.what_if)"""
+        fd, state_file = tempfile.mkstemp(prefix="vegha_fork_", suffix=".xml")
+        os.close(fd)
+        traci.simulation.saveState(state_file)
+        return {
+            "state_file": state_file,
+            "time": int(traci.simulation.getTime()),
+            "sumo_cmd": list(self.sumo_cmd),
+            "mode": self.mode,
+            "closed_streets": sorted(self.closed_streets),
+        }
+
+    def metrics_history(self, t_from=None, t_to=None, resolution=1, junctions=None):
+        """Downsampled KPI history (see KPIHistory.query)"""
+        if self.kpi_history is None:
+            return {"from": t_from, "to": t_to, "resolution": resolution, "time": []}
+        return self.kpi_history.query(t_from, t_to, resolution, junctions)
+
+    def heatmap_grid(self):
+        """Current decayed density grid (see DensityHeatmap.snapshot)"""
+        return self.heatmap.snapshot()
+
+    def street_coords(self, street):
+        """[[lat, lon], ...] of a street's first lane, for the closed-street overlay"""
+        try:
+            return self.projection.shape_to_geo(traci.lane.getShape(street + "_0"), latlon=True)
+        except:
+            return []
+
     def get_edge_geometry(self, edge_id):
         try:
-            shape = traci.edge.getShape(edge_id)
-            coords = []
-            for x, y in shape:
-                lon, lat = traci.simulation.convertGeo(x, y, fromGeo=False)
-                coords.append([lon, lat])
-            return coords
+            return self.projection.shape_to_geo(traci.edge.getShape(edge_id))
         except:
             return []
 
@@ -0,0 +1,110 @@
+import math
+import traci
+import traci.constants as tc
+
+# Lanes only used by these classes are not drawn (e.g. pure bike/foot lanes)
+RELEVANT_CLASSES = {"passenger", "bus", "truck", "trailer", "motorcycle", "moped", "taxi"}
+
+
+class TrafficLightDisplayIndex:
+    """
+    Static traffic-light display table (one signal head per controlled road).
+    Built once per network load; per step only the state strings are read,
+    through a TL_RED_YELLOW_GREEN_STATE subscription.
+    """
+
+    def __init__(self, heads):
+        # tl_id -> [(display_id, link_index, [lon, lat], angle), ...]
+        self.heads = heads
+
+    @classmethod
+    def build(cls, tls_ids, projection):
+        tls_ids = tls_ids or traci.trafficlight.getIDList()
+        heads = {}
+
+        for tl_id in tls_ids:
+            if tl_id.startswith(":"):
+                continue
+            try:
+                tl_heads = cls._build_tls(tl_id)
+            except traci.TraCIException:
+                continue
+            if tl_heads:
+                heads[tl_id] = tl_heads
+
+        # Head positions are still SUMO x/y here; project them in one batch
+        all_heads = [h for tl_heads in heads.values() for h in tl_heads]
+        geo = projection.to_geo([h[2] for h in all_heads]).tolist()
+        for head, pos in zip(all_heads, geo):
+            head[2][:] = pos
+
+        index = cls(heads)
+        index.subscribe()
+        print(f"🚦 Traffic light display index: {index.head_count()} heads at {len(heads)} signals")
+        return index
+
+    @staticmethod
+    def _build_tls(tl_id):
+        logics = traci.trafficlight.getCompleteRedYellowGreenDefinition(tl_id)
+        phases = logics[0].phases if logics else []
+        if logics and len(phases) <= 1:
+            return []
+
+        tl_heads = []
+        processed_roads = set()
+
+        for i, lane_id in enumerate(traci.trafficlight.getControlledLanes(tl_id)):
+            road_id = traci.lane.getEdgeID(lane_id)
+            if road_id in processed_roads or road_id.startswith(":"):
+                continue
+            processed_roads.add(road_id)
+
+            allowed_classes = traci.lane.getAllowed(lane_id)
+            if allowed_classes and not RELEVANT_CLASSES.intersection(allowed_classes):
+                continue
+
+            # Links that are never red (e.g. free right turns) get no head
+            if phases and not any(
+                i < len(p.state) and p.state[i].lower() == "r" for p in phases
+            ):
+                continue
+
+            shape = traci.lane.getShape(lane_id)
+            if not shape or len(shape) < 2:
+                continue
+
+            x1, y1 = shape[-2]
+            x2, y2 = shape[-1]
+            angle = math.degrees(math.atan2(y2 - y1, x2 - x1))
+
+            tl_heads.append((f"{tl_id}_{road_id}", i, [x2, y2], angle))
+
+        return tl_heads
+
+    def subscribe(self):
+        for tl_id in self.heads:
+            traci.trafficlight.subscribe(tl_id, [tc.TL_RED_YELLOW_GREEN_STATE])
+
+    def head_count(self):
+        return sum(len(h) for h in self.heads.values())
+
+    def current_states(self):
+        """{display_id: {"pos", "state", "angle"}} from this step's subscription results"""
+        results = traci.trafficlight.getAllSubscriptionResults()
+        traffic_lights = {}
+
+        for tl_id, tl_heads in self.heads.items():
+            state = results.get(tl_id, {}).get(tc.TL_RED_YELLOW_GREEN_STATE, "")
+
+            for display_id, link_index, pos, angle in tl_heads:
+                color = "green"
+                if link_index < len(state):
+                    char = state[link_index].lower()
+                    if char == "r":
+                        color = "red"
+                    elif char == "y":
+                        color = "yellow"
+
+                traffic_lights[display_id] = {"pos": pos, "state": color, "angle": angle}
+
+        return traffic_lights
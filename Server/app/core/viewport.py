@@ -0,0 +1,86 @@
+import numpy as np
+
+
+class VehicleGrid:
+    """
+    Uniform lon/lat grid over this step's vehicle positions.
+    Vehicles are sorted by cell key once per step; a viewport query then
+    binary-searches one key range per grid row.
+    """
+
+    def __init__(self, ids, positions, cell_size):
+        self.ids = ids
+        self.cell_size = cell_size
+        self.positions = np.asarray(positions, dtype=np.float64).reshape(-1, 2)
+
+        if len(self.positions):
+            self.origin = self.positions.min(axis=0)
+            cells = np.floor((self.positions - self.origin) / cell_size).astype(np.int64)
+            self.ncols = int(cells[:, 0].max()) + 1
+            self.nrows = int(cells[:, 1].max()) + 1
+            keys = cells[:, 1] * self.ncols + cells[:, 0]
+        else:
+            self.origin = np.zeros(2)
+            self.ncols = self.nrows = 0
+            keys = np.empty(0, dtype=np.int64)
+
+        self.order = np.argsort(keys, kind="stable")
+        self.sorted_keys = keys[self.order]
+
+    @classmethod
+    def from_vehicles(cls, vehicles, cell_size):
+        ids = list(vehicles)
+        return cls(ids, [vehicles[v]["pos"] for v in ids], cell_size)
+
+    def _cell_range(self, bounds):
+        """Clamped (col0, col1, row0, row1) covering bounds=(south, west, north, east)"""
+        south, west, north, east = bounds
+        col0, row0 = np.floor((np.array([west, south]) - self.origin) / self.cell_size)
+        col1, row1 = np.floor((np.array([east, north]) - self.origin) / self.cell_size)
+        col0, row0 = max(int(col0), 0), max(int(row0), 0)
+        col1, row1 = min(int(col1), self.ncols - 1), min(int(row1), self.nrows - 1)
+        return col0, col1, row0, row1
+
+    def query(self, bounds):
+        """Indices (into ids/positions) of vehicles inside bounds"""
+        if not self.ncols:
+            return np.empty(0, dtype=np.int64)
+
+        col0, col1, row0, row1 = self._cell_range(bounds)
+        if col0 > col1 or row0 > row1:
+            return np.empty(0, dtype=np.int64)
+
+        rows = np.arange(row0, row1 + 1)
+        starts = np.searchsorted(self.sorted_keys, rows * self.ncols + col0, side="left")
+        ends = np.searchsorted(self.sorted_keys, rows * self.ncols + col1, side="right")
+        candidates = np.concatenate([self.order[s:e] for s, e in zip(starts, ends)])
+
+        # Edge cells overlap the viewport only partially
+        south, west, north, east = bounds
+        lon, lat = self.positions[candidates, 0], self.positions[candidates, 1]
+        inside = (lon >= west) & (lon <= east) & (lat >= south) & (lat <= north)
+        return candidates[inside]
+
+    def cell_counts(self, bounds, factor=1):
+        """
+        [[lat, lon, count], ...] for occupied cells inside bounds.
+        factor merges factor x factor grid cells into one aggregate cell.
+        """
+        if not self.ncols:
+            return []
+
+        col0, col1, row0, row1 = self._cell_range(bounds)
+        keys, counts = np.unique(self.sorted_keys, return_counts=True)
+        rows, cols = keys // self.ncols, keys % self.ncols
+        visible = (cols >= col0) & (cols <= col1) & (rows >= row0) & (rows <= row1)
+        rows, cols, counts = rows[visible] // factor, cols[visible] // factor, counts[visible]
+
+        if factor > 1:
+            coarse, inverse = np.unique(rows * self.ncols + cols, return_inverse=True)
+            counts = np.bincount(inverse, weights=counts).astype(np.int64)
+            rows, cols = coarse // self.ncols, coarse % self.ncols
+
+        size = self.cell_size * factor
+        lon = self.origin[0] + (cols + 0.5) * size
+        lat = self.origin[1] + (rows + 0.5) * size
+        return [[float(a), float(o), int(c)] for a, o, c in zip(lat, lon, counts)]
@@ -0,0 +1,192 @@
+"""
+Headless what-if runs: how would closing these streets play out?
+
+The simulation's current state is saved (SUMOManager.fork_state) and each
+scenario gets its own SUMO process, started from that state by a worker
+process (`python -m core.what_if`, a fresh interpreter rather than a fork of
+the web server): a baseline with today's closures, and one per alternative
+with its streets closed as well. They run the next N simulated minutes in parallel,
+unpaced and without broadcasting, measuring network KPIs from one edge
+subscription per step. Same state and seed in every fork, so differences
+come from the closures.
+
+Only current closures carry over; events scheduled for later, ambulance
+signal priority and RL control are not part of the forks.
+"""
+
+import itertools
+import os
+import sys
+import time
+import types
+from multiprocessing.connection import Connection
+
+import eventlet
+import numpy as np
+import traci
+import traci.constants as tc
+
+from .closure_enforcer import ClosureEnforcer
+from .event_manager import CLOSED_TO
+from .sim_worker import start_module_process
+from .sumo_manager import SIGNAL_PROGRAMS
+
+EDGE_VARIABLES = (
+    tc.LAST_STEP_VEHICLE_NUMBER,
+    tc.LAST_STEP_VEHICLE_HALTING_NUMBER,
+    tc.LAST_STEP_MEAN_SPEED,
+)
+KPI_FIELDS = ("vehicles", "avg_speed", "waiting", "arrived", "teleports")
+
+
+def kpi_delta(kpis, baseline):
+    """kpis - baseline per field (negative waiting is an improvement)"""
+    return {k: round(kpis[k] - baseline[k], 2) for k in KPI_FIELDS}
+
+
+def _close_street(street, state):
+    street = street.lstrip("+")
+    traci.edge.setDisallowed(street, CLOSED_TO)
+    state.closed_streets.add(street)
+
+
+def _run_fork(conn, fork, streets, steps, label):
+    """Worker process: one scenario from the saved state; sends ("ok", kpis) or ("error", msg)"""
+    try:
+        traci.start(fork["sumo_cmd"], label=label)
+        traci.simulation.loadState(fork["state_file"])
+
+        program = SIGNAL_PROGRAMS.get(fork["mode"])
+        if program is not None:
+            for jid in traci.trafficlight.getIDList():
+                try:
+                    traci.trafficlight.setProgram(jid, program)
+                except traci.TraCIException:
+                    pass
+
+        # Lane permissions are not part of a saved state: close again
+        state = types.SimpleNamespace(closed_streets=set())
+        enforcer = ClosureEnforcer(state)
+        for street in dict.fromkeys(fork["closed_streets"] + list(streets)):
+            try:
+                _close_street(street, state)
+            except traci.TraCIException as e:
+                print(f"⚠️ What-if: cannot close {street}: {e}")
+        enforcer.streets_closed(state.closed_streets)
+
+        edges = [e for e in traci.edge.getIDList() if not e.startswith(":")]
+        for edge_id in edges:
+            traci.edge.subscribe(edge_id, EDGE_VARIABLES)
+
+        vehicles = halting = speed_sum = 0.0
+        arrived = teleports = 0
+        for _ in range(steps):
+            traci.simulationStep()
+            enforcer.update()
+            results = traci.edge.getAllSubscriptionResults()
+            values = np.array(
+                [[r.get(v, 0) for v in EDGE_VARIABLES] for r in results.values()],
+                dtype=np.float64,
+            ).reshape(-1, len(EDGE_VARIABLES))
+            vehicles += values[:, 0].sum()
+            halting += values[:, 1].sum()
+            speed_sum += (values[:, 0] * values[:, 2]).sum()
+            arrived += traci.simulation.getArrivedNumber()
+            teleports += traci.simulation.getStartingTeleportNumber()
+
+        conn.send(("ok", {
+            "vehicles": round(vehicles / max(steps, 1), 2),
+            "avg_speed": round(speed_sum / vehicles * 3.6, 2) if vehicles else 0.0,  # km/h
+            "waiting": round(halting / max(steps, 1), 2),
+            "arrived": arrived,
+            "teleports": teleports,
+        }))
+    except Exception as e:
+        conn.send(("error", str(e)))
+    finally:
+        try:
+            traci.close()
+        except Exception:
+            pass
+
+
+class WhatIfRunner:
+    def __init__(self, config):
+        what_if = config.get("what_if", {})
+        self.max_alternatives = what_if.get("max_alternatives", 4)
+        self.max_minutes = what_if.get("max_minutes", 60)
+        self.timeout = what_if.get("timeout", 120)
+        self._labels = itertools.count(1)
+
+    def run(self, fork, alternatives, minutes):
+        """
+        fork: SUMOManager.fork_state() result; alternatives: [{"name", "streets"}].
+        Blocks (green) until every scenario finished or the timeout passed.
+        """
+        steps = int(minutes * 60)
+        # Scenario 0 is the baseline, then the alternatives in order
+        scenarios = [[]] + [a["streets"] for a in alternatives]
+        started = time.monotonic()
+
+        pending = {}
+        try:
+            for number, streets in enumerate(scenarios):
+                conn, process = start_module_process("core.what_if")
+                pending[number] = (conn, process)
+                conn.send((fork, streets, steps, f"what-if-{next(self._labels)}"))
+
+            results = {}
+            while pending and time.monotonic() - started < self.timeout:
+                for number, (conn, process) in list(pending.items()):
+                    if conn.poll():
+                        try:
+                            results[number] = conn.recv()
+                        except EOFError:
+                            results[number] = ("error", "worker exited")
+                    elif process.poll() is not None and not conn.poll():
+                        results[number] = ("error", "worker exited")
+                    else:
+                        continue
+                    del pending[number]
+                    conn.close()
+                    process.wait()
+                eventlet.sleep(0.05)
+
+            for number in pending:
+                results[number] = ("error", f"timed out after {self.timeout}s")
+        finally:
+            for conn, process in pending.values():
+                conn.close()
+                process.terminate()
+                process.wait()
+            try:
+                os.remove(fork["state_file"])
+            except OSError:
+                pass
+
+        status, baseline = results[0]
+        response = {
+            "from": fork["time"],
+            "to": fork["time"] + steps,
+            "minutes": minutes,
+            "elapsed": round(time.monotonic() - started, 2),
+            "baseline": baseline if status == "ok" else {"error": baseline},
+            "alternatives": [],
+        }
+        for number, alternative in enumerate(alternatives, 1):
+            status, kpis = results[number]
+            entry = {"name": alternative["name"], "streets": alternative["streets"]}
+            if status != "ok":
+                entry["error"] = kpis
+            else:
+                entry["kpis"] = kpis
+                if "error" not in response["baseline"]:
+                    entry["delta"] = kpi_delta(kpis, baseline)
+            response["alternatives"].append(entry)
+        return response
+
+
+if __name__ == "__main__":
+    # Worker process: one scenario, arguments from WhatIfRunner.run
+    conn = Connection(int(sys.argv[1]))
+    _run_fork(conn, *conn.recv())
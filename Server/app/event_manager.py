@@ -1,4 +1,4 @@
-from core.event_manager import EventManager as BaseEventManager
+from core.event_manager import EventManager as BaseEventManager, event_times
 import random
 
 class EventManager(BaseEventManager):
@@ -13,16 +13,15 @@ class EventManager(BaseEventManager):
     def title_exists(self, title):
         return any(e.get('title') == title for e in self.events)
 
-    def id_exists(self, event_id):
-        return any(e.get('id') == event_id for e in self.events)
-
     def generate_color(self):
         """Generate a random bright color for the event"""
         return "#{:06x}".format(random.randint(0, 0xFFFFFF))
 
-    def create_event(self, event_id, title, streets):
+    def create_event(self, event_id, title, streets, start_time=None, end_time=None):
         """Create new event with detailed properties"""
         print(f"DEBUG: Extended create_event called on instance {id(self)}")
+        # Before anything is indexed or scheduled: raises ValueError on bad times
+        start_time, end_time = event_times(start_time, end_time, self.now)
         color = self.generate_color()
         
         event = {
@@ -30,12 +29,13 @@ class EventManager(BaseEventManager):
             'title': title,
             'streets': streets,
             'color': color,
-            'status': 'Active',
+            'status': 'Pending',
             'type': 'manual_event',
-            'start_time': 0,
-            'end_time': 99999999
+            'start_time': start_time,
+            'end_time': end_time
         }
-        self.events.append(event)
+        # Indexed and scheduled; closes its streets right away when already due
+        self._add_event(event)
         return event
 
     def get_events(self):
@@ -1,9 +1,11 @@
 from .base_mode import BaseMode
 from .sumo_events import SUMOEventsMode
+from .remote_mode import RemoteMode
+from .replay_mode import ReplayMode
 
 try:
     from .sumo_rl_events import SUMORLEventsMode
 except ImportError:
     SUMORLEventsMode = None
 
-__all__ = ['BaseMode', 'SUMOEventsMode', 'SUMORLEventsMode']
+__all__ = ['BaseMode', 'SUMOEventsMode', 'SUMORLEventsMode', 'RemoteMode', 'ReplayMode']
@@ -1,6 +1,11 @@
+import time
 import traci
 import eventlet
-import math
+import numpy as np
+
+from core.frame_stream import FrameStream
+from core.loop_metrics import METRICS
+from core.snapshot_buffer import SnapshotBuffer
 
 
 class BaseMode:
@@ -11,6 +16,9 @@ class BaseMode:
         self.events = event_manager
         self.socketio = socketio
         self.step = 0
+        self.frames = FrameStream(socketio, sumo_manager.config)
+        self.snapshots = SnapshotBuffer()
+        self.broadcasting = False
 
     def run(self):
         try:
@@ -18,27 +26,23 @@ class BaseMode:
 
             max_steps = self.sumo.config.get("max_steps", 7200)
 
+            # Clients are served by the broadcaster at a fixed rate, independent of stepping
+            self.broadcasting = True
+            self.socketio.start_background_task(target=self.broadcast_loop)
+
             while self.step < max_steps and self.sumo.simulation_running:
+                # Seconds per step; 0 is turbo (as fast as SUMO allows)
+                step_delay = self.sumo.config.get("simulation_speed", 0.1)
+
                 if not self.sumo.simulation_paused:
                     # Check if connection is still alive (safety)
                     try:
-                        traci.simulationStep()
-                        # Sync step with actual SUMO time (handles resets)
-                        current_time = traci.simulation.getTime()
-                        self.step = int(current_time)
+                        self.advance(step_delay)
                     except traci.FatalTraCIError:
                         print("⚠️ TraCI connection lost. Stopping loop.")
                         break
 
-                    self.events.update_event_statuses(self.step)
-                    self.apply_traffic_light_control()
-
-                    vehicles, traffic_lights = self.get_simulation_state()
-                    self.broadcast_state(vehicles, traffic_lights)
-
-                    self.step += 1
-
-                eventlet.sleep(self.sumo.config.get("simulation_speed", 0.1))
+                eventlet.sleep(step_delay if step_delay > 0 else 0)
 
             print("🛑 Simulation loop ended.")
 
@@ -46,6 +50,70 @@ class BaseMode:
             print(f"❌ Simulation error: {e}")
             self.sumo.simulation_running = False
 
+        finally:
+            self.broadcasting = False
+
+    def advance(self, step_delay):
+        """One simulation step: events, closures, signal control, snapshot"""
+        METRICS.tick()
+        with METRICS.phase("sumo"):
+            traci.simulationStep()
+            # Sync step with actual SUMO time (handles resets)
+            current_time = traci.simulation.getTime()
+            self.step = int(current_time)
+
+        with METRICS.phase("control"):
+            self.events.update_event_statuses(self.step)
+            self.sumo.closures.update()
+            self.sumo.vehicle_table.update()
+            self.sumo.emergency.update()
+            self.apply_traffic_light_control()
+
+        # Every step: subscribed vehicle columns (one TraCI call), KPIs and heatmap
+        with METRICS.phase("extract"):
+            rows = self.sumo.vehicle_table.read(self._get_vehicle_type)
+            geo = self.project(rows)
+            kpis = self.vehicle_kpis(rows)
+            self.record_kpis(kpis, geo)
+        METRICS.set_vehicles(len(rows))
+
+        # In turbo, build a frame only once the last snapshot went out, unless
+        # a recording needs every step
+        recorder = getattr(self.sumo, "recorder", None)
+        publish = step_delay > 0 or self.snapshots.consumed()
+        if publish or recorder is not None:
+            with METRICS.phase("extract"):
+                vehicles, traffic_lights = self.get_simulation_state(rows, kpis, geo)
+            snapshot = (self.step, vehicles, traffic_lights, [e.copy() for e in self.events.events])
+            if recorder is not None:
+                self.record_frame(recorder, snapshot)
+            if publish:
+                self.snapshots.publish(snapshot)
+
+        self.step += 1
+
+    def project(self, rows):
+        """(N, 2) lon/lat of the rows' vehicles, None if the projection failed"""
+        try:
+            return self.sumo.projection.to_geo(rows.xy)
+        except Exception as e:
+            print(f"⚠️ Projection error: {e}")
+            return None
+
+    def record_kpis(self, kpis, geo):
+        """Append this step to the KPI history and the density heatmap"""
+        try:
+            self.sumo.kpi_history.record(
+                self.step, kpis, self.sumo.junction_lanes.junction_totals()
+            )
+        except Exception as e:
+            print(f"⚠️ KPI history error: {e}")
+        if geo is not None:
+            try:
+                self.sumo.heatmap.record(self.step, geo)
+            except Exception as e:
+                print(f"⚠️ Heatmap error: {e}")
+
     def apply_traffic_light_control(self):
         """
         Priority Logic:
@@ -55,20 +123,10 @@ class BaseMode:
             return
 
         try:
-            # 1. Find all ambulances in the simulation
-            ambulances = [
-                v
-                for v in traci.vehicle.getIDList()
-                if ("truck" == self._get_vehicle_type(traci.vehicle.getTypeID(v)))
-                or self._get_vehicle_type(traci.vehicle.getTypeID(v)) == "ambulance"
-                or "emergency" in traci.vehicle.getTypeID(v).lower()
-                or "truck" in traci.vehicle.getTypeID(v).lower()
-            ]
-
+            # 1. Ambulances are tracked by the registry (with next-TLS subscriptions)
             processed_tls = set()
 
-            for amb_id in ambulances:
-                next_tls_list = traci.vehicle.getNextTLS(amb_id)
+            for amb_id, next_tls_list in self.sumo.emergency.next_tls():
                 if not next_tls_list:
                     continue
 
@@ -100,211 +158,66 @@ class BaseMode:
         except Exception as e:
             pass
 
-    def get_simulation_state(self):
-        """Extract vehicles + REAL traffic lights only"""
-        vehicles = {}
-        traffic_lights = {}
-        
-        # Global Stats
-        total_speed = 0
-        waiting = 0
-        count = 0
-
-        # ✅ NEW: Dynamic Dictionary for Per-Type Stats
-        # Structure: { 'car': {'count': 0, 'speed_sum': 0, 'waiting': 0}, 'bus': ... }
-        type_stats = {}
-
-        # ---------------- VEHICLES ----------------
-        try:
-            for v in traci.vehicle.getIDList():
-                try:
-                    road_id = traci.vehicle.getRoadID(v)
-
-                    # Remove vehicles that will cross closed streets
-                    try:
-                        route_edges = traci.vehicle.getRoute(v)
-                        if any(edge in self.sumo.closed_streets for edge in route_edges):
-                            traci.vehicle.remove(v)
-                            continue
-                    except:
-                        pass
-
-                    if road_id in self.sumo.closed_streets:
-                        continue
-
-                    # Remove vehicles on active event streets
-                    skip = False
-                    for event in self.events.events:
-                        if event["status"] == "Active" and road_id in event["streets"]:
-                            try:
-                                traci.vehicle.remove(v)
-                            except:
-                                pass
-                            skip = True
-                            break
-
-                    if skip:
-                        continue
-
-                    # Get Vehicle Data
-                    x, y = traci.vehicle.getPosition(v)
-                    lon, lat = traci.simulation.convertGeo(x, y, fromGeo=False)
-                    angle = traci.vehicle.getAngle(v)
-                    vtype = traci.vehicle.getTypeID(v)
-                    speed = traci.vehicle.getSpeed(v)
-                    speed_kmh = speed * 3.6
-                    
-                    # Determine Type
-                    std_type = self._get_vehicle_type(vtype)
-
-                    vehicles[v] = {
-                        "pos": [lon, lat],
-                        "angle": angle,
-                        "type": std_type,
-                    }
-                    
-                    # --- Global Stats ---
-                    total_speed += speed_kmh
-                    if speed < 0.1:
-                        waiting += 1
-                    count += 1
-
-                    # --- ✅ NEW: Per-Type Stats Accumulation ---
-                    if std_type not in type_stats:
-                        type_stats[std_type] = {
-                            "count": 0,
-                            "speed_sum": 0,
-                            "waiting": 0
-                        }
-                    
-                    type_stats[std_type]["count"] += 1
-                    type_stats[std_type]["speed_sum"] += speed_kmh
-                    if speed < 0.1:
-                        type_stats[std_type]["waiting"] += 1
-
-                except:
-                    pass
-        except:
-            pass
-
-        # ---------------- TRAFFIC LIGHTS ----------------
-        try:
-            target_tls = (
-                self.sumo.active_tls
-                if hasattr(self.sumo, "active_tls") and self.sumo.active_tls
-                else traci.trafficlight.getIDList()
-            )
+    def vehicle_kpis(self, rows):
+        """Global and per-type speed (km/h) / waiting KPIs of one step's vehicles"""
+        speed_kmh = rows.speed * 3.6
+        stopped = rows.speed < 0.1
+        count = len(rows)
 
-            for tl_id in target_tls:
-                try:
-                    if tl_id.startswith(":"): continue
-
-                    controlled_lanes = traci.trafficlight.getControlledLanes(tl_id)
-                    state = traci.trafficlight.getRedYellowGreenState(tl_id)
-
-                    try:
-                        logics = traci.trafficlight.getCompleteRedYellowGreenDefinition(tl_id)
-                        if logics and len(logics) > 0:
-                            if len(logics[0].phases) <= 1: continue
-                    except:
-                        pass
-
-                    processed_roads = set()
-
-                    for i, lane_id in enumerate(controlled_lanes):
-                        road_id = traci.lane.getEdgeID(lane_id)
-                        if road_id in processed_roads or road_id.startswith(":"): continue
-                        processed_roads.add(road_id)
-
-                        allowed_classes = traci.lane.getAllowed(lane_id)
-                        relevant_classes = {"passenger", "bus", "truck", "trailer", "motorcycle", "moped", "taxi",
-                   }
-                        if allowed_classes:
-                            if not any(c in allowed_classes for c in relevant_classes): continue
-
-                        try:
-                            if logics and len(logics) > 0:
-                                current_logic = logics[0]
-                                can_be_red = False
-                                for p in current_logic.phases:
-                                    if i < len(p.state) and "r" in p.state[i].lower():
-                                        can_be_red = True
-                                        break
-                                if not can_be_red: continue
-                        except:
-                            pass
-
-                        shape = traci.lane.getShape(lane_id)
-                        if not shape or len(shape) < 2: continue
-
-                        x1, y1 = shape[-2]
-                        x2, y2 = shape[-1]
-                        lon, lat = traci.simulation.convertGeo(x2, y2, fromGeo=False)
-                        angle = math.degrees(math.atan2(y2 - y1, x2 - x1))
-
-                        color = "green"
-                        if i < len(state):
-                            char = state[i].lower()
-                            if "r" in char: color = "red"
-                            elif "y" in char: color = "yellow"
-
-                        display_id = f"{tl_id}_{road_id}"
-                        traffic_lights[display_id] = {"pos": [lon, lat], "state": color, "angle": angle}
-                except:
-                    pass
-        except:
-            pass
-
-        # Calculate Global Averages
-        avg_speed = int(total_speed / count) if count > 0 else 0
-        
-        # ✅ NEW: Calculate Averages for Each Type
+        # ✅ Per-type stats: { 'car': {'count', 'avg_speed', 'waiting'}, 'bus': ... }
         final_type_stats = {}
-        for t, data in type_stats.items():
-            c = data["count"]
-            avg_s = int(data["speed_sum"] / c) if c > 0 else 0
-            final_type_stats[t] = {
-                "count": c,
-                "avg_speed": avg_s,
-                "waiting": data["waiting"]
-            }
+        if count:
+            types = np.asarray(rows.types)
+            for t in dict.fromkeys(rows.types):
+                mask = types == t
+                c = int(mask.sum())
+                final_type_stats[t] = {
+                    "count": c,
+                    "avg_speed": int(speed_kmh[mask].sum() / c),
+                    "waiting": int(stopped[mask].sum()),
+                }
 
         # Keep backward compatibility for Ambulance specific keys
         amb_data = final_type_stats.get("ambulance", {"count": 0, "avg_speed": 0, "waiting": 0})
 
-        return vehicles, {
-            "traffic_lights": traffic_lights,
-            "avg_speed": avg_speed,
-            "waiting": waiting,
+        return {
+            "avg_speed": int(speed_kmh.sum() / count) if count > 0 else 0,
+            "waiting": int(stopped.sum()),
             # Legacy keys (so your current frontend doesn't break)
             "amb_waiting": amb_data["waiting"],
             "amb_count": amb_data["count"],
             "amb_avg_speed": amb_data["avg_speed"],
             # ✅ NEW: Full breakdown
-            "vehicle_stats": final_type_stats 
+            "vehicle_stats": final_type_stats,
         }
 
-    def broadcast_state(self, vehicles, tl_data):
-        """Emit to all connected clients"""
-        self.socketio.emit(
-            "update",
-            {
-                "vehicles": vehicles,
-                "traffic_lights": tl_data["traffic_lights"],
-                "time": self.step,
-                "avg_speed": tl_data["avg_speed"],
-                "waiting": tl_data["waiting"],
-                "events": [e.copy() for e in self.events.events],
-                
-                # Legacy Ambulance Stats
-                "amb_waiting": tl_data["amb_waiting"],
-                "amb_count": tl_data["amb_count"],
-                "amb_avg_speed": tl_data["amb_avg_speed"],
-                
-                # ✅ NEW: Send the full breakdown to frontend
-                "vehicle_stats": tl_data["vehicle_stats"]
-            },
-        )
+    def get_simulation_state(self, rows, kpis, geo):
+        """Extract vehicles + REAL traffic lights only (from vehicle_table rows)"""
+        vehicles = {}
+        traffic_lights = {}
+
+        # ---------------- VEHICLES ----------------
+        # geo: the rows' positions, projected to lon/lat in one batch
+        if geo is not None:
+            vehicles = {
+                v: {"pos": pos, "angle": angle, "type": vtype}
+                for v, pos, angle, vtype in zip(rows.ids, geo.tolist(), rows.angle.tolist(), rows.types)
+            }
+
+        # ---------------- TRAFFIC LIGHTS ----------------
+        try:
+            traffic_lights = self.sumo.tls_index.current_states()
+        except Exception:
+            pass
+
+        return vehicles, {"traffic_lights": traffic_lights, **kpis}
+
+    def record_frame(self, recorder, snapshot):
+        """Append this step to the recording (every step, so replays have no gaps)"""
+        try:
+            recorder.record(*snapshot)
+        except Exception as e:
+            print(f"⚠️ Recording error: {e}")
 
     # motor,car,truck,bus
     def _get_vehicle_type(self, vtype):
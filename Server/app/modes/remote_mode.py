@@ -0,0 +1,17 @@
+from core.frame_stream import FrameStream
+
+from .base_mode import BaseMode
+
+
+class RemoteMode(BaseMode):
+    """Web-server side of a worker-process simulation: only broadcasts its snapshots"""
+
+    def __init__(self, sumo_manager, event_manager, socketio, snapshots, room_prefix=""):
+        super().__init__(sumo_manager, event_manager, socketio)
+        self.snapshots = snapshots
+        self.frames = FrameStream(socketio, sumo_manager.config, room_prefix)
+
+    def run(self):
+        # Stepping happens in the worker; this is just the fixed-rate broadcaster
+        self.broadcasting = True
+        self.broadcast_loop()
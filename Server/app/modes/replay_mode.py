@@ -0,0 +1,44 @@
+import time
+
+import eventlet
+
+from .base_mode import BaseMode
+
+
+class ReplayMode(BaseMode):
+    """Streams a recording (ReplaySUMOManager) with the live `update` protocol"""
+
+    def run(self):
+        self.broadcasting = True
+        self.socketio.start_background_task(target=self.broadcast_loop)
+
+        fps = self.sumo.config.get("streaming", {}).get("broadcast_fps", 10)
+        interval = 1.0 / fps
+        archive = self.sumo.archive
+        shown = None
+        last = time.monotonic()
+
+        while self.broadcasting:
+            now = time.monotonic()
+            if not self.sumo.simulation_paused:
+                # Seconds per simulated second, as in live mode; turbo plays 20x
+                step_delay = self.sumo.config.get("simulation_speed", 0.1) or 0.05
+                self.sumo.position += (now - last) / step_delay
+                if self.sumo.position >= archive.end:
+                    self.sumo.position = float(archive.end)
+                    self.sumo.simulation_paused = True
+            last = now
+
+            t = int(self.sumo.position)
+            if t != shown or self.sumo.seeked:
+                self.sumo.seeked = False
+                shown = t
+                try:
+                    snapshot = archive.frame_at(t)
+                    self.step = snapshot[0]
+                    self.events.events = snapshot[3]
+                    self.snapshots.publish(snapshot)
+                except Exception as e:
+                    print(f"⚠️ Replay read error: {e}")
+
+            eventlet.sleep(max(0.0, interval - (time.monotonic() - now)))
@@ -21,9 +21,15 @@ class SUMORLEventsMode(BaseMode):
         self.agent = None
         self.controlled_junctions = []
         self.model_loaded = False
+
+        # Decisions every N simulated seconds; phases hold in between
+        self.decision_interval = self.rl_config.get('decision_interval', 5)
+        self._next_decision = 0
+        self._lane_index = None  # sumo.junction_lanes the slots were built for
+        self._slots = None
     
     def apply_traffic_light_control(self):
-        """Load model on FIRST call + Update events"""
+        """Load model on FIRST call, then one batched decision per interval"""
         
         # Load model only once
         if not self.model_loaded:
@@ -35,20 +41,23 @@ class SUMORLEventsMode(BaseMode):
                 self.sumo.simulation_running = False
                 return
         
-        # Update event statuses EVERY step
-        self.events.update_event_statuses(self.step)
-        
         if not self.agent:
             return
+
+        # Time went back (reset): decide again right away
+        if self.step < self._next_decision - self.decision_interval:
+            self._next_decision = 0
+        if self.step < self._next_decision:
+            return
+        self._next_decision = self.step + self.decision_interval
         
-        # ONE model controls ALL junctions
-        for j_id in self.controlled_junctions:
+        # ONE model controls ALL junctions, in one forward pass
+        states = self.get_junction_states()
+        with torch.no_grad():
+            actions = torch.argmax(self.agent(torch.from_numpy(states)), dim=1).tolist()
+
+        for j_id, action in zip(self.controlled_junctions, actions):
             try:
-                state = self.get_junction_state(j_id)
-                
-                with torch.no_grad():
-                    action = torch.argmax(self.agent(torch.FloatTensor(state).unsqueeze(0)), dim=1).item()
-                
                 traci.trafficlight.setPhase(j_id, action)
             except:
                 pass
@@ -82,23 +91,26 @@ class SUMORLEventsMode(BaseMode):
         self.agent.eval()
         print("✅ AI model loaded - Events + Traffic Control ACTIVE")
     
-    def get_junction_state(self, junction_id):
-        """Extract state and pad/truncate to config state_dim"""
-        state = []
-        try:
-            for lane_id in traci.lane.getIDList():
-                if junction_id in lane_id:
-                    queue = traci.lane.getWaitingTime(lane_id)
-                    density = traci.lane.getLastStepVehicleNumber(lane_id)
-                    state.extend([queue, density])
-        except:
-            pass
-        
+    def get_junction_states(self):
+        """
+        (junctions x state_dim) states from the lane subscriptions: per
+        controlled lane [waiting time, vehicles], zero-padded/truncated
+        """
         state_dim = self.rl_config.get('state_dim', 8)
-        
-        # Pad or truncate to state_dim
-        while len(state) < state_dim:
-            state.append(0)
-        state = state[:state_dim]
-        
-        return np.array(state, dtype=np.float32)
+        index = self.sumo.junction_lanes
+
+        # Lane rows per junction; rebuilt only when the network was reloaded
+        if self._lane_index is not index:
+            self._lane_index = index
+            self._slots = index.lane_slots(self.controlled_junctions, -(-state_dim // 2))
+
+        per_lane = np.zeros((len(index.lanes) + 1, 2), dtype=np.float32)  # last row: padding
+        try:
+            values = index.lane_values()
+            per_lane[:-1, 0] = values[:, 2]  # waiting time
+            per_lane[:-1, 1] = values[:, 1]  # vehicles
+        except Exception as e:
+            print(f"⚠️ RL state error: {e}")
+
+        states = per_lane[self._slots].reshape(len(self.controlled_junctions), -1)
+        return np.ascontiguousarray(states[:, :state_dim])
@@ -0,0 +1,33 @@
+"""
+Builds a simulation (SUMO manager, event manager, mode) from config.
+
+main.py uses it for the in-process simulation, worker processes (see
+core/sim_worker) for theirs. It imports nothing of the web server, so a
+worker started with a fresh interpreter does not run main.py again.
+"""
+
+from core.sumo_manager import SUMOManager
+
+# Use our Extended EventManager from app/
+from app.event_manager import EventManager
+
+
+def mode_class(name):
+    """Mode class for config `mode` (replay has no simulation to build)"""
+    if name == "sumo_events":
+        from modes.sumo_events import SUMOEventsMode
+
+        return SUMOEventsMode
+    if name == "sumo_rl_events":
+        from modes.sumo_rl_events import SUMORLEventsMode
+
+        return SUMORLEventsMode
+    raise ValueError(f"❌ Unknown mode: {name}")
+
+
+def build_simulation(config, socketio=None, label="default", sumo_mode="vegha"):
+    """SUMO manager, event manager and mode (in this process or a worker)"""
+    sumo_manager = SUMOManager(config, mode=sumo_mode, label=label)
+    event_manager = EventManager(sumo_manager)
+    mode = mode_class(config.get("mode", "sumo_events"))
+    return sumo_manager, event_manager, mode(sumo_manager, event_manager, socketio, config)
@@ -37,6 +37,18 @@ def set_mode():
     if mode not in ["vegha", "fixed"]:
         return {"error": "Invalid mode"}, 400
 
+    if session_pool is not None:
+        # Only the requesting session is switched (and reset)
+        session = session_from_request(session_pool, request)
+        if session is None:
+            return {"error": "Unknown session"}, 404
+        if session.id != DEFAULT_SESSION:
+            session.sumo.mode = mode
+            session.sumo.reset_simulation()
+            session.sumo.start_simulation()
+            print(f"🔄 Session {session.id} mode changed to {mode}")
+            return {"message": f"Mode set to {mode}"}, 200
+
     SUMO_MODE = mode
     sumo_manager.mode = mode
     sumo_manager.reset_simulation()
@@ -47,6 +59,10 @@ def set_mode():
 
 @app.route("/api/mode", methods=["GET"])
 def get_mode():
+    if session_pool is not None:
+        session = session_from_request(session_pool, request)
+        if session is not None and session.id != DEFAULT_SESSION:
+            return {"mode": session.sumo.mode}, 200
     return {"mode": SUMO_MODE}, 200
 
 
@@ -67,42 +83,75 @@ def serve_image(filename):
 
 
 # Import core modules
-from core.sumo_manager import SUMOManager
-# EventManager is imported later from app.event_manager
 from api import socketio_handlers
 
 # Select mode
 if MODE == "sumo_events":
-    from modes.sumo_events import SUMOEventsMode
-
-    mode_class = SUMOEventsMode
     print("📌 Mode: SUMO + Events")
 
 elif MODE == "sumo_rl_events":
-    from modes.sumo_rl_events import SUMORLEventsMode
-
-    mode_class = SUMORLEventsMode
     print("🤖 Mode: SUMO + Events + RL")
 
+elif MODE == "replay":
+    from modes.replay_mode import ReplayMode
+
+    print("⏯️ Mode: Replay of a recorded run (no SUMO)")
+
 else:
     raise ValueError(f"❌ Unknown mode: {MODE}")
 
 from app.api.routes import register_routes
 
+# SUMO manager, Extended EventManager (app/event_manager.py) and mode
+from app.simulation import build_simulation
+
+
 # Initialize managers
-sumo_manager = SUMOManager(CONFIG)
-# Use our Extended EventManager from app/
-from app.event_manager import EventManager
-event_manager = EventManager(sumo_manager)
-current_mode = mode_class(sumo_manager, event_manager, socketio, CONFIG)
+if MODE == "replay":
+    from core.replay import ReplaySUMOManager, ReplayEventManager
+
+    sumo_manager = ReplaySUMOManager.from_config(CONFIG)
+    event_manager = ReplayEventManager()
+    current_mode = ReplayMode(sumo_manager, event_manager, socketio)
+elif CONFIG.get("worker", {}).get("enabled", False):
+    # SUMO/TraCI live in a separate process; this one only serves clients
+    from core.sim_worker import SimulationClient, RemoteSUMOManager, RemoteEventManager
+    from modes.remote_mode import RemoteMode
+
+    simulation_client = SimulationClient(CONFIG)
+    sumo_manager = RemoteSUMOManager(simulation_client, CONFIG)
+    event_manager = RemoteEventManager(simulation_client)
+    current_mode = RemoteMode(sumo_manager, event_manager, socketio, simulation_client.snapshots)
+    print("🧵 Simulation: worker process")
+else:
+    sumo_manager, event_manager, current_mode = build_simulation(CONFIG, socketio)
+
+# Extra isolated sessions (each a worker process); main's simulation is "default"
+session_pool = None
+if CONFIG.get("sessions", {}).get("enabled", False) and MODE != "replay":
+    from core.session_pool import Session, SessionPool, DEFAULT_SESSION, session_from_request
+    from modes.remote_mode import RemoteMode
+
+    session_pool = SessionPool(
+        socketio,
+        CONFIG,
+        Session(DEFAULT_SESSION, sumo_manager, event_manager, current_mode),
+        RemoteMode,
+    )
+    print(f"🧩 Sessions: up to {session_pool.max_sessions} besides the default")
+
+# Side-by-side vegha/fixed runs (two worker processes, started on demand)
+from core.comparison import ComparisonRun
+
+comparison = ComparisonRun(socketio, CONFIG) if MODE != "replay" else None
 
 # Register SocketIO handlers
 socketio_handlers.register_socketio_handlers(
-    socketio, sumo_manager, event_manager, current_mode
+    socketio, sumo_manager, event_manager, current_mode, session_pool, comparison
 )
 
 # Register API Routes
-register_routes(app, sumo_manager, event_manager, socketio)
+register_routes(app, sumo_manager, event_manager, socketio, session_pool, comparison, current_mode)
 
 if __name__ == "__main__":
     print("=" * 60)
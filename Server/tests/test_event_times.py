@@ -0,0 +1,42 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app"))
+
+pytest.importorskip("traci")
+pytest.importorskip("eventlet")
+
+from core.event_manager import NO_END, event_times  # noqa: E402
+
+
+def test_defaults_to_now_and_no_end():
+    assert event_times(None, None, 100) == (100, NO_END)
+
+
+def test_accepts_numeric_strings():
+    assert event_times("120", "180.5", 100) == (120, 180.5)
+
+
+def test_future_and_running_windows_accepted():
+    assert event_times(150, 200, 100) == (150, 200)
+    assert event_times(50, 200, 100) == (50, 200)
+
+
+def test_window_that_already_ended_is_rejected():
+    with pytest.raises(ValueError, match="already passed"):
+        event_times(10, 20, 100)
+    with pytest.raises(ValueError, match="already passed"):
+        event_times(None, 100, 100)
+
+
+def test_end_before_start_is_rejected():
+    with pytest.raises(ValueError, match="before start_time"):
+        event_times(300, 200, 100)
+
+
+@pytest.mark.parametrize("value", ["soon", True, float("nan"), float("inf")])
+def test_invalid_times_are_rejected(value):
+    with pytest.raises(ValueError):
+        event_times(value, None, 0)